@@ -0,0 +1,248 @@
+from array import array
+
+from game import DEFAULT, MISS, SUNK, OCCUPIED, DEFAULT_SHIPS
+from player import Player
+from events import ShotResult
+
+
+class Rotation(object):
+    """
+    Turn order of the players still in the game, as a circular doubly linked list over player numbers: moving to the
+        next player and removing an eliminated one are both O(1), whatever the number of players.
+    """
+    __slots__ = ('next', 'previous', 'current', 'alive')
+
+    def __init__(self, n_players):
+        self.next = array('i', [(k + 1) % n_players for k in range(n_players)])
+        self.previous = array('i', [(k - 1) % n_players for k in range(n_players)])
+        self.current = 0  # number of the player whose turn it is
+        self.alive = n_players  # number of players still in the rotation
+
+    def advance(self):
+        """
+        :return: number of the player whose turn comes next, who becomes the current player
+        """
+        self.current = self.next[self.current]
+        return self.current
+
+    def remove(self, k):
+        """
+        Take player k out of the rotation. The current player cannot be removed.
+        """
+        following = self.next[k]
+        preceding = self.previous[k]
+        self.next[preceding] = following
+        self.previous[following] = preceding
+        self.next[k] = self.previous[k] = -1
+        self.alive -= 1
+
+    def __contains__(self, k):
+        return self.next[k] >= 0
+
+    def __iter__(self):
+        """
+        Iterate over the players still in the rotation, starting with the current one
+        """
+        k = self.current
+        for _ in range(self.alive):
+            yield k
+            k = self.next[k]
+
+
+class ArenaPlayer(Player):
+    """
+    Player of an Arena. Its shots are kept by the arena, one bit per cell and opponent, so its own tracking board stays
+        empty and the methods that would read or shoot through it refuse with an error pointing to the arena instead.
+    """
+    def _arena_only(self):
+        return ValueError("%s plays in an Arena: shoot with Arena.take_turn() and read what they know of an opponent "
+                          "with Arena.tracking_board()" % self.name)
+
+    def shoot_and_update_boards(self, enemy, coordinate, validate=True):
+        raise self._arena_only()
+
+    def fire(self, enemy, index):
+        raise self._arena_only()
+
+    def get_tracking_board_as_list(self):
+        raise self._arena_only()
+
+    def pretty_print_tracking_board(self):
+        raise self._arena_only()
+
+
+class Arena(object):
+    def __init__(self, names, board_size=(10, 10)):
+        """
+        Initializer for Arena class, a free-for-all game between any number of players. Players take turns in a fixed
+            rotation and shoot at any opponent still in the game. A player is eliminated once all of their ships are
+            sunk and the last player standing wins.
+        Instead of one tracking board per opponent, every player keeps one bit per cell and opponent telling whether
+            they shot that cell: what they see of an opponent is read from that opponent's fleet board when asked for,
+            see .tracking_board(). With 64 players on 10 by 10 boards this is 13 bytes per pair of players instead of
+            100.
+        :param names: list of the players' names, in turn order (at least 2)
+        :param board_size: default size is 10 by 10 (2-tuple)
+        """
+        if len(names) < 2:
+            raise ValueError("An arena needs at least 2 players. You entered: %d" % len(names))
+        # players only use their fleet board: their shots are kept in self.shots
+        self.players = [ArenaPlayer(name, board_size) for name in names]
+        self.board_x = board_size[0]
+        self.board_y = board_size[1]
+        self.mask_size = (self.board_x * self.board_y + 7) // 8  # bytes of the bitmap of one pair of players
+        # shots[a] holds the bitmaps of player a's shots at every player, player d's at offset d * mask_size
+        self.shots = [bytearray(self.mask_size * len(names)) for _ in names]
+        self.rotation = Rotation(len(names))
+        self.turn = 0
+        self.game_over = False
+        self.winner = None
+        self.placed = False  # True once .initialize_ships() placed every fleet
+        self.eliminated = list()  # (player number, turn, number of the player who sank their last ship), in order
+        self.listeners = list()  # callables notified with the ShotResult of every turn, see .add_listener()
+
+        # Current default ships, can be expanded by .add_custom_ship() method
+        self.ships = list(DEFAULT_SHIPS)
+
+    def add_custom_ship(self, ship_name, dimensions):
+        """
+        Add a custom sized ship to every player's fleet, see Game.add_custom_ship()
+        """
+        self.ships.append((ship_name, dimensions))
+
+    def add_listener(self, listener):
+        """
+        Subscribe to the outcome of every turn, see Game.add_listener()
+        """
+        self.listeners.append(listener)
+
+    def initialize_ships(self, positions):
+        """
+        Place the fleets of all players
+        :param positions: one list per player of ((x, y), orientation) pairs, one per ship of self.ships, see
+            Game.initialize_ships()
+        :return: does not return
+        """
+        if len(positions) != len(self.players):
+            raise ValueError("There are %d fleets for %d players" % (len(positions), len(self.players)))
+        for player, pos_or in zip(self.players, positions):
+            if len(pos_or) != len(self.ships):
+                raise ValueError("length of %s's positions and self.ships must match" % player.name)
+            for (ship_name, dimensions), (coordinate, orientation) in zip(self.ships, pos_or):
+                player.place_ship(ship_name, orientation, dimensions, coordinate)
+        self.placed = True
+
+    def current_player(self):
+        """
+        :return: number of the player whose turn it is
+        """
+        return self.rotation.current
+
+    def is_alive(self, k):
+        """
+        :return: True while player k has ships afloat
+        """
+        return k in self.rotation
+
+    def opponents(self, k):
+        """
+        :return: numbers of the players still in the game other than player k, in turn order
+        """
+        return [d for d in self.rotation if d != k]
+
+    def has_shot(self, attacker, target, coordinate):
+        """
+        :return: True if player attacker already shot player target at coordinate
+        """
+        i = coordinate[1] * self.board_x + coordinate[0]
+        return self.shots[attacker][target * self.mask_size + (i >> 3)] >> (i & 7) & 1 == 1
+
+    def tracking_board(self, attacker, target):
+        """
+        What player attacker knows of player target's board: the state of every cell they shot, plus the cells of
+            every sunk ship of target, which all players are told about
+        :return: list of lists (one list per row) of cell states, like Player.get_tracking_board_as_list()
+        """
+        cells = self.players[target].my_board.cells
+        mask = self.shots[attacker]
+        offset = target * self.mask_size
+        view = bytearray(cells).translate(_PUBLIC)
+        for byte in range(self.mask_size):
+            bits = mask[offset + byte]
+            while bits:
+                low = bits & -bits
+                i = byte * 8 + low.bit_length() - 1
+                view[i] = cells[i]
+                bits ^= low
+        w = self.board_x
+        return [list(view[i:i + w]) for i in range(0, len(view), w)]
+
+    def take_turn(self, target, coordinate):
+        """
+        The current player shoots player target at coordinate, then the turn passes to the next player still in the
+            game. Listeners registered with .add_listener() are notified of the outcome.
+        :param target: number of the player to shoot, who must still be in the game
+        :param coordinate: (x, y) tuple of the cell to shoot
+        :return: ShotResult. hit is True whenever the cell holds a ship, even if another player hit it first, and sunk
+            is the ship if this shot sank it. winner is set on the shot that eliminates the last opponent.
+        """
+        if not self.placed:
+            raise ValueError("The fleets must be placed with .initialize_ships() before shooting")
+        if self.game_over:
+            raise ValueError("The game is over, %s won" % self.winner.name)
+        attacker = self.rotation.current
+        if target == attacker or target not in self.rotation:
+            raise ValueError("Player %d cannot be shot by player %d" % (target, attacker))
+        x, y = coordinate
+        if x < 0 or y < 0 or x > self.board_x - 1 or y > self.board_y - 1:
+            raise ValueError("Cannot shoot at a coordinate %s outside the board of %d by %d (zero indexed)"
+                             % (str(coordinate), self.board_x, self.board_y))
+        i = y * self.board_x + x
+        mask = self.shots[attacker]
+        byte = target * self.mask_size + (i >> 3)
+        if mask[byte] >> (i & 7) & 1:
+            raise ValueError("Shot at %s had already been fired previously by %s at %s"
+                             % (str(coordinate), self.players[attacker].name, self.players[target].name))
+        mask[byte] |= 1 << (i & 7)
+
+        shooter = self.players[attacker]
+        enemy = self.players[target]
+        board = enemy.my_board
+        state = board.cells[i]
+        if state == OCCUPIED:
+            ship_id = enemy.receive_damage(coordinate)
+            if board.fleet.life[ship_id] == 0:
+                bx, by, width, height = board.fleet.rectangle(ship_id)
+                board.fill(bx, by, width, height, SUNK)
+                result = ShotResult(shooter, enemy, coordinate, True, board.ship_at(coordinate))
+            else:
+                result = ShotResult(shooter, enemy, coordinate, True)
+        elif state == DEFAULT:
+            board.set(i, MISS)
+            result = ShotResult(shooter, enemy, coordinate, False)
+        else:
+            # another player shot this cell first: the shooter learns what it holds, nothing changes
+            result = ShotResult(shooter, enemy, coordinate, state != MISS)
+        result.turn = self.turn
+        self.turn += 1
+
+        rotation = self.rotation
+        if enemy.life == 0:
+            rotation.remove(target)
+            self.eliminated.append((target, result.turn, attacker))
+            if rotation.alive == 1:
+                self.game_over = True
+                self.winner = result.winner = shooter
+        if not self.game_over:
+            rotation.advance()
+
+        for listener in self.listeners:
+            listener(result)
+        return result
+
+    def is_game_over(self):
+        return self.game_over
+
+
+# every cell state as seen by a player who did not shoot it: only sunk ships are public
+_PUBLIC = bytes(SUNK if state == SUNK else DEFAULT for state in range(256))
@@ -0,0 +1,225 @@
+import numpy as np
+
+from game import DEFAULT, MISS, HIT, SUNK, OCCUPIED, DEFAULT_SHIPS
+
+
+class BatchGame(object):
+    def __init__(self, n_games, board_size=(10, 10)):
+        """
+        Initializer for BatchGame class. A BatchGame holds n_games independent 2-player games as stacked NumPy arrays
+            and resolves one turn of every game in a single call. Boards are indexed [player, game, x, y] where player
+            0 is player1 and player 1 is player2.
+        :param n_games: number of games to play in lockstep (int)
+        :param board_size: default size is 10 by 10 (2-tuple)
+        """
+        self.n_games = n_games
+        self.board_x = board_size[0]
+        self.board_y = board_size[1]
+        self.turn = np.zeros(n_games, dtype=np.int32)
+        self.game_over = np.zeros(n_games, dtype=bool)
+        self.winner = np.full(n_games, -1, dtype=np.int8)  # 0 if player1 won, 1 if player2 won, -1 while playing
+
+        shape = (2, n_games, self.board_x, self.board_y)
+        self.my_boards = np.zeros(shape, dtype=np.uint8)  # state of each player's fleet and missed shots
+        self.tracking_boards = np.zeros(shape, dtype=np.uint8)  # each player's shots on enemy territory
+        self.ship_ids = np.full(shape, -1, dtype=np.int16)  # index into self.ships of the ship on a cell, -1 if none
+        self.ship_life = None  # (2, n_games, len(self.ships)) remaining life of every ship, set by initialize_ships
+        self.life = np.zeros((2, n_games), dtype=np.int32)  # life == 0 means that the player is dead
+
+        # Current default ships, can be expanded by .add_custom_ship() method
+        self.ships = list(DEFAULT_SHIPS)
+
+    def add_custom_ship(self, ship_name, dimensions):
+        """
+        Method to add custom sized ships to every game of the batch. Same as Game.add_custom_ship().
+        :param ship_name: name of the custom ship (string)
+        :param dimensions: dimensions of the custom ship (2-tuple). The order of 2-tuple does not matter.
+        :return: does not return
+        """
+        self.ships.append((ship_name, dimensions))
+
+    def initialize_ships(self, p1_pos_or, p2_pos_or):
+        """
+        Method to initialize player1 and player2 ships of every game
+        :param p1_pos_or: a list with one entry per game, each entry being the p1_pos_or list that
+            Game.initialize_ships() takes, i.e. one ((x, y), orientation) tuple per ship of self.ships
+        :param p2_pos_or: same as p1_pos_or but for player2
+        :return: does not return
+        """
+        for pos_or in (p1_pos_or, p2_pos_or):
+            if len(pos_or) != self.n_games:
+                raise ValueError("expected ship placements for %d games, got %d" % (self.n_games, len(pos_or)))
+
+        p1_coords = np.array([[p[0] for p in g] for g in p1_pos_or], dtype=np.intp).reshape(self.n_games, -1, 2)
+        p2_coords = np.array([[p[0] for p in g] for g in p2_pos_or], dtype=np.intp).reshape(self.n_games, -1, 2)
+        p1_vertical = self._orientations_to_array(p1_pos_or)
+        p2_vertical = self._orientations_to_array(p2_pos_or)
+        self.initialize_ship_arrays(p1_coords, p1_vertical, p2_coords, p2_vertical)
+
+    def _orientations_to_array(self, pos_or):
+        vertical = np.zeros((self.n_games, len(self.ships)), dtype=bool)
+        for g, placements in enumerate(pos_or):
+            if len(placements) != len(self.ships):
+                raise ValueError("number of placements and self.ships must match in game %d" % g)
+            for s, (coordinate, orientation) in enumerate(placements):
+                if orientation == 'vertical':
+                    vertical[g, s] = True
+                elif orientation != 'horizontal':
+                    raise ValueError("Orientation must be vertical or horizontal. You entered: %s" % orientation)
+        return vertical
+
+    def initialize_ship_arrays(self, p1_coords, p1_vertical, p2_coords, p2_vertical):
+        """
+        Array form of initialize_ships(), suited to placements that were generated in bulk
+        :param p1_coords: integer array of shape (n_games, len(self.ships), 2) with the TOP LEFT-MOST (x, y) of every
+            ship of player1
+        :param p1_vertical: boolean array of shape (n_games, len(self.ships)), True for 'vertical' placements
+        :param p2_coords: same as p1_coords but for player2
+        :param p2_vertical: same as p1_vertical but for player2
+        :return: does not return
+        """
+        # build both fleets before touching the game state so that an invalid placement leaves the batch unchanged
+        p1_ids = self._build_fleet("player1", np.asarray(p1_coords), np.asarray(p1_vertical, dtype=bool))
+        p2_ids = self._build_fleet("player2", np.asarray(p2_coords), np.asarray(p2_vertical, dtype=bool))
+
+        self.ship_ids[0] = p1_ids
+        self.ship_ids[1] = p2_ids
+        self.my_boards[:] = np.where(self.ship_ids >= 0, OCCUPIED, DEFAULT)
+
+        sizes = np.array([d[0] * d[1] for _, d in self.ships], dtype=np.int32)
+        self.ship_life = np.empty((2, self.n_games, len(self.ships)), dtype=np.int32)
+        self.ship_life[:] = sizes
+        self.life[:] = sizes.sum()
+
+    def _build_fleet(self, player_label, coords, vertical):
+        """
+        Helper method that validates one player's placements for every game and returns the resulting ship id boards
+        :return: int16 array of shape (n_games, board_x, board_y)
+        """
+        if coords.shape != (self.n_games, len(self.ships), 2) or vertical.shape != (self.n_games, len(self.ships)):
+            raise ValueError("%s placements must cover %d ships in each of %d games"
+                             % (player_label, len(self.ships), self.n_games))
+
+        ids = np.full((self.n_games, self.board_x, self.board_y), -1, dtype=np.int16)
+        xr = np.arange(self.board_x)
+        yr = np.arange(self.board_y)
+
+        for s, (ship_name, dimension) in enumerate(self.ships):
+            longer_d = max(dimension)
+            shorter_d = min(dimension)
+            # vertical ships have their longest dimension along the y-axis, horizontal ones along the x-axis
+            w = np.where(vertical[:, s], shorter_d, longer_d)
+            h = np.where(vertical[:, s], longer_d, shorter_d)
+            x = coords[:, s, 0]
+            y = coords[:, s, 1]
+
+            bad = (x < 0) | (y < 0) | (x + w > self.board_x) | (y + h > self.board_y)
+            if bad.any():
+                g = int(np.argmax(bad))
+                raise ValueError("%s's %s does not fit on board at (%d,%d) in game %d"
+                                 % (player_label, ship_name, x[g], y[g], g))
+
+            in_x = (xr >= x[:, None]) & (xr < (x + w)[:, None])
+            in_y = (yr >= y[:, None]) & (yr < (y + h)[:, None])
+            mask = in_x[:, :, None] & in_y[:, None, :]
+
+            overlap = (mask & (ids >= 0)).any(axis=(1, 2))
+            if overlap.any():
+                g = int(np.argmax(overlap))
+                raise ValueError("%s's %s overlaps with another ship at (%d,%d) in game %d"
+                                 % (player_label, ship_name, x[g], y[g], g))
+            ids[mask] = s
+        return ids
+
+    def take_turn(self, coords_to_shoot):
+        """
+        Resolve one turn of every game that is not over yet. Just like Game.take_turn(), each game decides by itself
+            whose turn it is. Games that are already over ignore their coordinate.
+        :param coords_to_shoot: integer array-like of shape (n_games, 2) holding the (x, y) target of every game
+        :return: (hit, sunk, game_over) where hit is a boolean array telling which shots hit a ship, sunk is an integer
+            array holding the index into self.ships of the ship sunk by the shot (-1 if none) and game_over is a boolean
+            array telling which games are over after this turn
+        """
+        if self.ship_life is None:
+            raise ValueError("ships must be placed with initialize_ships() before taking turns")
+        coords = np.asarray(coords_to_shoot, dtype=np.intp)
+        if coords.shape != (self.n_games, 2):
+            raise ValueError("expected an array of shape (%d, 2), got %s" % (self.n_games, str(coords.shape)))
+
+        hit = np.zeros(self.n_games, dtype=bool)
+        sunk = np.full(self.n_games, -1, dtype=np.int16)
+
+        g = np.flatnonzero(~self.game_over)
+        x = coords[g, 0]
+        y = coords[g, 1]
+        attacker = self.turn[g] % 2
+        receiver = 1 - attacker
+
+        # validate every shot before changing any state, with the same rules as Player._valid_shot()
+        bad = (x < 0) | (y < 0)
+        if bad.any():
+            i = int(np.argmax(bad))
+            raise ValueError("Cannot shoot at a negative coordinate (%d, %d) in game %d" % (x[i], y[i], g[i]))
+        bad = (x > self.board_x - 1) | (y > self.board_y - 1)
+        if bad.any():
+            i = int(np.argmax(bad))
+            raise ValueError("Cannot shoot at a coordinate (%d, %d) greater than the board size of %d by %d "
+                             "(zero indexed) in game %d" % (x[i], y[i], self.board_x, self.board_y, g[i]))
+        bad = self.tracking_boards[attacker, g, x, y] != DEFAULT
+        if bad.any():
+            i = int(np.argmax(bad))
+            raise ValueError("Shot at (%d, %d) had already been fired previously in game %d" % (x[i], y[i], g[i]))
+
+        shot_hit = self.my_boards[receiver, g, x, y] == OCCUPIED
+        state = np.where(shot_hit, HIT, MISS).astype(np.uint8)
+        self.tracking_boards[attacker, g, x, y] = state
+        self.my_boards[receiver, g, x, y] = state
+        hit[g] = shot_hit
+
+        # record the damage of the shots that hit
+        hg = g[shot_hit]
+        hr = receiver[shot_hit]
+        hs = self.ship_ids[hr, hg, x[shot_hit], y[shot_hit]]
+        self.ship_life[hr, hg, hs] -= 1
+        self.life[hr, hg] -= 1
+
+        # update the boards of the games in which a ship has been sunk
+        sunk_now = self.ship_life[hr, hg, hs] == 0
+        if sunk_now.any():
+            sg = hg[sunk_now]
+            sr = hr[sunk_now]
+            ss = hs[sunk_now]
+            sunk[sg] = ss
+            cells = self.ship_ids[sr, sg] == ss[:, None, None]
+            self.my_boards[sr, sg] = np.where(cells, SUNK, self.my_boards[sr, sg])
+            self.tracking_boards[1 - sr, sg] = np.where(cells, SUNK, self.tracking_boards[1 - sr, sg])
+
+        self.turn[g] += 1
+
+        dead = self.life[receiver, g] == 0
+        self.game_over[g[dead]] = True
+        self.winner[g[dead]] = attacker[dead]
+
+        return hit, sunk, self.game_over.copy()
+
+    def is_game_over(self):
+        """
+        :return: True once every game of the batch is over
+        """
+        return bool(self.game_over.all())
+
+    def get_player1_boards(self, game_index):
+        """
+        Same as Game.get_player1_boards() for one game of the batch
+        :param game_index: index of the game (int)
+        :return: (b1, b2) nested lists of player1's tracking board and of the board containing player1's own ships
+        """
+        return self.tracking_boards[0, game_index].T.tolist(), self.my_boards[0, game_index].T.tolist()
+
+    def get_player2_boards(self, game_index):
+        """
+        Same as Game.get_player2_boards() for one game of the batch
+        :param game_index: index of the game (int)
+        :return: (b1, b2) nested lists of player2's tracking board and of the board containing player2's own ships
+        """
+        return self.tracking_boards[1, game_index].T.tolist(), self.my_boards[1, game_index].T.tolist()
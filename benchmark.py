@@ -0,0 +1,305 @@
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+
+from game import Game, DEFAULT_SHIPS
+from player import Player
+from placements import sample_fleet
+
+RESULTS_VERSION = 1  # bump whenever the layout of the JSON written by `run` changes
+MAX_SHOTS = 20000  # shots timed per repeat by the shooting benchmarks, so that large boards stay affordable
+MAX_MISSES = 5000  # misses added to each player's script in the full game benchmark
+MIN_TIME = 0.05  # seconds timed per run of a case at least
+
+# The boards and fleets every suite covers. Fleets named 'xN' are N copies of the default fleet.
+SUITES = {
+    'quick': [((10, 10), 'default'), ((10, 10), 'custom'), ((100, 100), 'default'), ((100, 100), 'x10')],
+    'full': [((10, 10), 'default'), ((10, 10), 'custom'),
+             ((100, 100), 'default'), ((100, 100), 'custom'), ((100, 100), 'x10'),
+             ((1000, 1000), 'default'), ((1000, 1000), 'custom'), ((1000, 1000), 'x10'), ((1000, 1000), 'x100')],
+}
+
+
+def fleet(name):
+    """
+    :param name: 'default', 'custom' (the default ships plus the 2x2 and 1x1 ships of game.py's demo) or 'xN'
+    :return: list of (name, dimensions) pairs, as Game.ships
+    """
+    if name == 'default':
+        return list(DEFAULT_SHIPS)
+    if name == 'custom':
+        return list(DEFAULT_SHIPS) + [("custom1", (2, 2)), ("custom2", (1, 1))]
+    if name.startswith('x') and name[1:].isdigit():
+        return [("%s %d" % (ship_name, n), dimensions)
+                for n in range(int(name[1:])) for ship_name, dimensions in DEFAULT_SHIPS]
+    raise ValueError("Unknown fleet %s, expected default, custom or xN" % name)
+
+
+def _new_game(board_size, ships, rng):
+    """
+    Helper returning a Game with both fleets randomly placed
+    """
+    game = Game("John", "Sam", board_size)
+    game.ships = list(ships)
+    game.initialize_ships(sample_fleet(ships, board_size, rng), sample_fleet(ships, board_size, rng))
+    return game
+
+
+def _random_cells(board_size, n, rng):
+    """
+    :return: list of n distinct random (x, y) cells
+    """
+    board_x = board_size[0]
+    return [(i % board_x, i // board_x) for i in rng.sample(range(board_size[0] * board_size[1]), n)]
+
+
+def bench_place_ship(board_size, ships, rng):
+    """
+    Player.place_ship() for every ship of a random fleet on an empty board
+    """
+    player = Player("John", board_size)
+    placements = sample_fleet(ships, board_size, rng)
+    start = time.perf_counter()
+    for (ship_name, dimensions), (coordinate, orientation) in zip(ships, placements):
+        player.place_ship(ship_name, orientation, dimensions, coordinate)
+    return len(ships), time.perf_counter() - start
+
+
+def bench_shoot_and_update_boards(board_size, ships, rng):
+    """
+    Player.shoot_and_update_boards() of one player at random cells of the other, without the Game bookkeeping
+    """
+    game = _new_game(board_size, ships, rng)
+    shooter = game.player1
+    enemy = game.player2
+    cells = _random_cells(board_size, min(MAX_SHOTS, board_size[0] * board_size[1]), rng)
+    start = time.perf_counter()
+    for coordinate in cells:
+        shooter.shoot_and_update_boards(enemy, coordinate)
+    return len(cells), time.perf_counter() - start
+
+
+def bench_take_turn(board_size, ships, rng):
+    """
+    Game.take_turn() with both players shooting random cells until the game ends or MAX_SHOTS shots were fired
+    """
+    game = _new_game(board_size, ships, rng)
+    n = min(MAX_SHOTS // 2, board_size[0] * board_size[1])
+    turns = [c for pair in zip(_random_cells(board_size, n, rng), _random_cells(board_size, n, rng)) for c in pair]
+    shots = 0
+    start = time.perf_counter()
+    for coordinate in turns:
+        game.take_turn(coordinate)
+        shots += 1
+        if game.game_over:
+            break
+    return shots, time.perf_counter() - start
+
+
+def bench_board_export(board_size, ships, rng):
+    """
+    Player.get_tracking_board_as_list() and Player.get_my_ships_as_list() of a game halfway through, one op being
+        one call of both
+    """
+    game = _new_game(board_size, ships, rng)
+    for coordinate in _random_cells(board_size, min(MAX_SHOTS, board_size[0] * board_size[1]) // 4, rng):
+        game.player1.shoot_and_update_boards(game.player2, coordinate)
+    player = game.player1
+    calls = max(1, 1000000 // (board_size[0] * board_size[1]))
+    start = time.perf_counter()
+    for _ in range(calls):
+        player.get_tracking_board_as_list()
+        player.get_my_ships_as_list()
+    return calls, time.perf_counter() - start
+
+
+def _script(board_size, enemy, rng):
+    """
+    Helper returning the shots of one player in a scripted game: every cell of the enemy fleet and up to MAX_MISSES
+        other cells, in random order
+    """
+    board_x = board_size[0]
+    ship_cells = set(c for ship in enemy.my_board.ships for c in ship.coordinates)
+    n = min(MAX_MISSES, board_size[0] * board_size[1] - len(ship_cells))
+    misses = list()
+    for i in rng.sample(range(board_size[0] * board_size[1]), min(n + len(ship_cells), board_size[0] * board_size[1])):
+        if len(misses) == n:
+            break
+        if (i % board_x, i // board_x) not in ship_cells:
+            misses.append((i % board_x, i // board_x))
+    shots = list(ship_cells) + misses
+    rng.shuffle(shots)
+    return shots
+
+
+def bench_full_game(board_size, ships, rng):
+    """
+    A complete scripted game like the one of game.py's demo: ships placement with Game.initialize_ships() and turns
+        until one player wins. One op is one whole game.
+    """
+    p1 = sample_fleet(ships, board_size, rng)
+    p2 = sample_fleet(ships, board_size, rng)
+    # the scripts need the ship cells, so they are computed on an untimed copy of the game
+    scripted = Game("John", "Sam", board_size)
+    scripted.ships = list(ships)
+    scripted.initialize_ships(p1, p2)
+    scripts = (_script(board_size, scripted.player2, rng), _script(board_size, scripted.player1, rng))
+
+    start = time.perf_counter()
+    game = Game("John", "Sam", board_size)
+    game.ships = list(ships)
+    game.initialize_ships(p1, p2)
+    turn = 0
+    while not game.game_over:
+        game.take_turn(scripts[turn % 2][turn // 2])
+        turn += 1
+    return 1, time.perf_counter() - start
+
+
+BENCHMARKS = {
+    'place_ship': bench_place_ship,
+    'shoot_and_update_boards': bench_shoot_and_update_boards,
+    'take_turn': bench_take_turn,
+    'board_export': bench_board_export,
+    'full_game': bench_full_game,
+}
+
+
+def run(suite='quick', repeat=5, names=None, seed=0, out=sys.stdout):
+    """
+    Run the benchmarks of a suite. Every (benchmark, board, fleet) case is run `repeat` times with the garbage
+        collector disabled, and each run builds fresh games so that no run sees the shots of the previous one.
+    :param suite: name of a suite of SUITES
+    :param repeat: number of timed runs per case
+    :param names: list of benchmark names to run, None for all of BENCHMARKS
+    :param seed: seed of the fleets and shots, the same seed times the same games
+    :param out: file progress lines are printed to, None to stay quiet
+    :return: the results, as saved in JSON by the `run` command
+    """
+    if suite not in SUITES:
+        raise ValueError("Unknown suite %s, expected one of %s" % (suite, ', '.join(sorted(SUITES))))
+    results = list()
+    for name in names or sorted(BENCHMARKS):
+        if name not in BENCHMARKS:
+            raise ValueError("Unknown benchmark %s, expected one of %s" % (name, ', '.join(sorted(BENCHMARKS))))
+        for board_size, fleet_name in SUITES[suite]:
+            ships = fleet(fleet_name)
+            timings = list()
+            ops = 0
+            for r in range(repeat):
+                # a run calls the benchmark again (on new games) until MIN_TIME is reached, to keep timer noise low
+                ops = 0
+                elapsed = 0.0
+                gc.collect()
+                gc.disable()
+                try:
+                    while elapsed < MIN_TIME:
+                        rng = random.Random("%d/%s/%dx%d/%s/%d/%d" % (seed, name, board_size[0], board_size[1],
+                                                                     fleet_name, r, ops))
+                        n, t = BENCHMARKS[name](board_size, ships, rng)
+                        ops += n
+                        elapsed += t
+                finally:
+                    gc.enable()
+                timings.append(elapsed / ops)
+            timings.sort()
+            result = {'name': name, 'board': list(board_size), 'fleet': fleet_name, 'ships': len(ships), 'ops': ops,
+                      'best': timings[0], 'median': timings[len(timings) // 2], 'repeat': repeat}
+            results.append(result)
+            if out is not None:
+                print("%-24s %9s %-8s %12s/op (median %s)" % (name, "%dx%d" % board_size, fleet_name,
+                                                               _format(result['best']), _format(result['median'])),
+                      file=out)
+    return {'version': RESULTS_VERSION, 'suite': suite, 'seed': seed, 'created': time.time(),
+            'python': platform.python_version(), 'implementation': platform.python_implementation(),
+            'machine': platform.machine(), 'results': results}
+
+
+def _format(seconds):
+    if seconds < 1e-3:
+        return "%.2fus" % (seconds * 1e6)
+    if seconds < 1:
+        return "%.2fms" % (seconds * 1e3)
+    return "%.2fs" % seconds
+
+
+def _key(result):
+    return result['name'], tuple(result['board']), result['fleet']
+
+
+def compare(baseline, current, threshold=0.1, out=sys.stdout):
+    """
+    Compare two result sets of `run` case by case on their best time per op
+    :param baseline: results of the reference run
+    :param current: results of the run being checked
+    :param threshold: relative slowdown above which a case is flagged as a regression, 0.1 for 10%
+    :param out: file the comparison table is printed to, None to stay quiet
+    :return: list of (name, board, fleet, ratio) tuples of the regressions, ratio being current / baseline
+    """
+    for results in (baseline, current):
+        if results.get('version') != RESULTS_VERSION:
+            raise ValueError("Unsupported results version %s, expected %d" % (results.get('version'), RESULTS_VERSION))
+    old = dict((_key(r), r) for r in baseline['results'])
+    regressions = list()
+    for result in current['results']:
+        key = _key(result)
+        name, board, fleet_name = key
+        case = "%-24s %9s %-8s" % (name, "%dx%d" % board, fleet_name)
+        if key not in old:
+            if out is not None:
+                print("%s %12s  (not in baseline)" % (case, _format(result['best'])), file=out)
+            continue
+        ratio = result['best'] / old[key]['best']
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append((name, board, fleet_name, ratio))
+            flag = '  REGRESSION'
+        elif ratio < 1 / (1 + threshold):
+            flag = '  faster'
+        if out is not None:
+            print("%s %12s -> %12s  %+6.1f%%%s" % (case, _format(old[key]['best']), _format(result['best']),
+                                                    100 * (ratio - 1), flag), file=out)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the battleship engine and compare results")
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    run_parser = commands.add_parser('run', help="run a suite and save the results as JSON")
+    run_parser.add_argument('--suite', default='quick', choices=sorted(SUITES))
+    run_parser.add_argument('--repeat', type=int, default=5, help="timed runs per case, the best one is kept")
+    run_parser.add_argument('--benchmark', action='append', choices=sorted(BENCHMARKS),
+                            help="benchmark to run, can be repeated (default: all)")
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--output', '-o', default='benchmark.json', help="file the JSON results are written to")
+
+    compare_parser = commands.add_parser('compare', help="compare results against a baseline")
+    compare_parser.add_argument('baseline', help="JSON results of the reference run")
+    compare_parser.add_argument('current', help="JSON results of the run being checked")
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help="relative slowdown flagged as a regression (default: 0.1, i.e. 10%%)")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        if args.repeat < 1:
+            parser.error("--repeat must be 1 or more")
+        results = run(args.suite, args.repeat, args.benchmark, args.seed)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+        print("results written to %s" % args.output)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print("%d regression(s) above %.0f%%" % (len(regressions), 100 * args.threshold))
+            sys.exit(1)
+        print("no regression above %.0f%%" % (100 * args.threshold))
@@ -0,0 +1,239 @@
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed by Board.as_array()
+    np = None
+
+from constants import DEFAULT
+from ship import FleetTable, Ship
+
+
+class Board(object):
+    """
+    Flat, row-major storage for the cell states of one board. Cell (x, y) lives at index y * board_x + x of a
+        bytearray, so reading or writing a cell is a single index operation instead of hashing an (x, y) tuple.
+        Every cell starts as DEFAULT (0).
+    """
+    sparse = False  # see sparse_board.SparseBoard
+
+    def __init__(self, board_dimension):
+        self.board_x = board_dimension[0]
+        self.board_y = board_dimension[1]
+        self.cells = bytearray(self.board_x * self.board_y)  # one byte per cell holding DEFAULT/MISS/HIT/SUNK/OCCUPIED
+        self.rows_cache = None  # cached result of .rows(), None until it is first asked for
+        self.dirty_rows = None  # rows of rows_cache written to since it was built, None until rows_cache is
+
+    def copy(self):
+        """
+        :return: independent copy of this board
+        """
+        board = Board.__new__(Board)
+        board.board_x = self.board_x
+        board.board_y = self.board_y
+        board.cells = bytearray(self.cells)
+        board.rows_cache = self.rows_cache
+        board.dirty_rows = None if self.dirty_rows is None else set(self.dirty_rows)
+        return board
+
+    def set(self, index, state):
+        """
+        Write the state of the cell at index, marking its row of the cached view as dirty
+        """
+        self.cells[index] = state
+        if self.rows_cache is not None:
+            self.dirty_rows.add(index // self.board_x)
+
+    def restore(self, index, state):
+        """
+        Give the cell at index back the state it had before it was first written to, e.g. to undo a shot
+        :param state: that state, DEFAULT or OCCUPIED
+        """
+        self.set(index, state)
+
+    def fill(self, x, y, width, height, state):
+        """
+        Write the state of every cell of a rectangle, one slice per row or per column, whichever is fewer
+        :param x: x-coord of the TOP LEFT-MOST cell of the rectangle
+        :param y: y-coord of the TOP LEFT-MOST cell of the rectangle
+        """
+        _fill(self.cells, self.board_x, x, y, width, height, bytes((state,)))
+        if self.rows_cache is not None:
+            self.dirty_rows.update(range(y, y + height))
+
+    def index(self, coordinate):
+        """
+        :param coordinate: (x, y) tuple inside the board
+        :return: position of the coordinate in self.cells
+        """
+        return coordinate[1] * self.board_x + coordinate[0]
+
+    def coordinate(self, index):
+        """
+        :param index: position in self.cells
+        :return: (x, y) tuple of the cell stored at index
+        """
+        return index % self.board_x, index // self.board_x
+
+    def in_bounds(self, coordinate):
+        x, y = coordinate
+        return 0 <= x < self.board_x and 0 <= y < self.board_y
+
+    def __getitem__(self, coordinate):
+        return self.cells[coordinate[1] * self.board_x + coordinate[0]]
+
+    def __setitem__(self, coordinate, state):
+        self.set(coordinate[1] * self.board_x + coordinate[0], state)
+
+    def __contains__(self, coordinate):
+        """
+        A cell is 'in' the board once it holds anything other than DEFAULT, the same way a coordinate used to be a key
+            of the old dict based boards.
+        """
+        return self.in_bounds(coordinate) and self[coordinate] != DEFAULT
+
+    def values(self):
+        """
+        :return: the states of the cells written to (plus DEFAULT cells on dense boards), e.g. for `HIT in .values()`
+        """
+        return self.cells
+
+    def as_list(self):
+        """
+        :return: a list of lists (one list per row) containing the state of every cell
+        """
+        cells = self.cells
+        w = self.board_x
+        return [list(cells[i:i + w]) for i in range(0, len(cells), w)]
+
+    def rows(self):
+        """
+        Cached, read-only view of the board: the same content as .as_list() but as a tuple of row tuples. Only the rows
+            written to since the previous call are rebuilt, and the same tuples are returned while nothing changes.
+        :return: tuple of tuples containing the state of every cell
+        """
+        cells = self.cells
+        w = self.board_x
+        if self.rows_cache is None:
+            self.rows_cache = tuple(tuple(cells[i:i + w]) for i in range(0, len(cells), w))
+            self.dirty_rows = set()
+        elif self.dirty_rows:
+            rows = list(self.rows_cache)
+            for y in self.dirty_rows:
+                rows[y] = tuple(cells[y * w:(y + 1) * w])
+            self.rows_cache = tuple(rows)
+        self.dirty_rows.clear()
+        return self.rows_cache
+
+    def as_memoryview(self):
+        """
+        :return: zero-copy, read-only memoryview of the cell states in row-major order (index y * board_x + x)
+        """
+        return memoryview(self.cells).toreadonly()
+
+    def as_array(self):
+        """
+        :return: zero-copy, read-only numpy uint8 array of shape (board_y, board_x) sharing memory with the board, so
+            it always reflects the current state of the cells
+        """
+        if np is None:
+            raise ImportError("Board.as_array() requires numpy")
+        array_view = np.frombuffer(self.cells, dtype=np.uint8).reshape(self.board_y, self.board_x)
+        array_view.flags.writeable = False
+        return array_view
+
+
+def _fill(cells, board_x, x, y, width, height, value):
+    """
+    Helper writing value (a sequence of one item) to every cell of a rectangle of a flat row-major sequence
+    """
+    if width >= height:
+        row = value * width
+        for j in range(y, y + height):
+            start = j * board_x + x
+            cells[start:start + width] = row
+    else:
+        column = value * height
+        end = (y + height - 1) * board_x + x + 1
+        for i in range(width):
+            cells[y * board_x + x + i:end + i:board_x] = column
+
+
+# typecodes of FleetBoard.ship_ids from the narrowest, and the number of ships each can tell apart
+SHIP_ID_TYPECODES = (('b', 127), ('h', 32767), ('i', 2147483647))
+SHIP_ID_LIMITS = dict(SHIP_ID_TYPECODES)
+
+
+class FleetBoard(Board):
+    """
+    Board holding a player's own fleet. On top of the cell states it keeps the fleet in a FleetTable and a cell -> ship
+        id index, where the ship id is the row of the ship in the table and -1 marks a cell without a ship. The index
+        uses the narrowest array typecode that fits the number of ships.
+    """
+    def __init__(self, board_dimension):
+        Board.__init__(self, board_dimension)
+        self.fleet = FleetTable()  # ships in the order they were placed
+        self.ship_ids = array('b', [-1]) * len(self.cells)
+        self.ids_shared = False  # True when ship_ids is shared with a copy of this board and must be copied on write
+
+    @property
+    def ships(self):
+        """
+        List of the ships in the order they were placed, as Ship facades over self.fleet
+        """
+        fleet = self.fleet
+        return [Ship.of(fleet, k) for k in range(len(fleet))]
+
+    def copy(self):
+        """
+        Copy of this board. The cell -> ship id index and the fleet's static columns, which do not change once the fleet
+            is placed, are shared between both boards until one of them places another ship.
+        """
+        board = FleetBoard.__new__(FleetBoard)
+        board.board_x = self.board_x
+        board.board_y = self.board_y
+        board.cells = bytearray(self.cells)
+        board.rows_cache = self.rows_cache
+        board.dirty_rows = None if self.dirty_rows is None else set(self.dirty_rows)
+        board.fleet = self.fleet.copy()
+        board.ship_ids = self.ship_ids
+        board.ids_shared = self.ids_shared = True
+        return board
+
+    def add_ship(self, ship_name, orientation, rectangle, life, state):
+        """
+        Register a ship on the board
+        :param ship_name: name of the ship
+        :param orientation: 'vertical' or 'horizontal'
+        :param rectangle: (x, y, width, height) of the cells covered by the ship, see ship.ship_rectangle()
+        :param life: remaining life of the ship
+        :param state: initial state of the ship's cells (OCCUPIED)
+        :return: id of the ship on this board
+        """
+        ship_id = self.fleet.add(ship_name, orientation, rectangle, life)
+
+        if self.ids_shared or ship_id > SHIP_ID_LIMITS[self.ship_ids.typecode]:
+            code = next(code for code, limit in SHIP_ID_TYPECODES if ship_id <= limit)
+            self.ship_ids = array(code, self.ship_ids)
+            self.ids_shared = False
+
+        x, y, width, height = rectangle
+        _fill(self.ship_ids, self.board_x, x, y, width, height, array(self.ship_ids.typecode, (ship_id,)))
+        self.fill(x, y, width, height, state)
+        return ship_id
+
+    def ship_id_at(self, x, y):
+        """
+        :return: id of the ship covering (x, y), -1 if there is none
+        """
+        return self.ship_ids[y * self.board_x + x]
+
+    def ship_at(self, coordinate):
+        """
+        :param coordinate: (x, y) tuple inside the board
+        :return: the Ship occupying coordinate, or None if there is no ship there
+        """
+        ship_id = self.ship_ids[coordinate[1] * self.board_x + coordinate[0]]
+        if ship_id < 0:
+            return None
+        return Ship.of(self.fleet, ship_id)
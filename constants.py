@@ -0,0 +1,7 @@
+# CONSTANTS
+# cell states, in a module of their own so that boards and players can import them without importing game
+DEFAULT = 0  # represents cells that have not been shot
+MISS = 1  # represents cells that have missed shots
+HIT = 2  # represents cells that are occupied and have been shot
+SUNK = 3  # represents cells with sunken ships
+OCCUPIED = 4  # represents cells containing ships that have not been hit
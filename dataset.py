@@ -0,0 +1,249 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from game import DEFAULT_SHIPS, MISS, HIT, SUNK
+from tournament import derive_seed, start_game
+
+# name -> (dtype, shape of one record given the number of cells and of ships) of every column of a dataset. A dtype of
+# None is sized by column_dtypes() from the values the column has to hold.
+COLUMNS = {
+    'game': (np.int64, lambda cells, ships: ()),  # number of the game in the dataset
+    'turn': (np.int32, lambda cells, ships: ()),  # turn of the shot in its game
+    'player': (np.uint8, lambda cells, ships: ()),  # 0 if player1 fired the shot, 1 if player2 did
+    'board': (np.uint8, lambda cells, ships: (cells,)),  # shooter's tracking board before the shot, row-major
+    'fleet': (None, lambda cells, ships: (ships,)),  # remaining life of each enemy ship before the shot
+    'shot': (np.int32, lambda cells, ships: ()),  # cell index (y * board_x + x) of the shot
+    'outcome': (np.uint8, lambda cells, ships: ()),  # MISS, HIT or SUNK
+}
+
+
+def column_dtypes(fleet):
+    """
+    :param fleet: (name, dimensions) pairs of the fleet of every game
+    :return: dict column name -> numpy dtype of the column for that fleet
+    """
+    largest_ship = max(d0 * d1 for _, (d0, d1) in fleet)
+    dtypes = dict((name, dtype) for name, (dtype, _) in COLUMNS.items())
+    # smallest signed type holding the life of the largest ship, at least int16
+    dtypes['fleet'] = np.promote_types(np.int16, np.min_scalar_type(largest_ship)).type
+    return dtypes
+
+
+def _atomic_write(path, write):
+    """
+    Helper writing a file under a temporary name then renaming it, so that an interrupted run never leaves a truncated
+        file behind
+    """
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+class ChunkWriter(object):
+    """
+    Buffers records column by column in preallocated arrays of chunk_size rows and saves every full chunk as one .npy
+        file per column, so memory use does not depend on the number of records written
+    """
+    def __init__(self, directory, prefix, chunk_size, cells, fleet):
+        self.directory = directory
+        self.prefix = prefix
+        self.chunk_size = chunk_size
+        dtypes = column_dtypes(fleet)
+        self.buffers = dict((name, np.empty((chunk_size,) + shape(cells, len(fleet)), dtype=dtypes[name]))
+                            for name, (_, shape) in COLUMNS.items())
+        self.rows = 0  # rows of the current chunk filled so far
+        self.chunks = list()  # number of rows of every chunk saved so far
+
+    def row(self):
+        """
+        :return: index in self.buffers of the next record, saving the current chunk first if it is full
+        """
+        if self.rows == self.chunk_size:
+            self.flush()
+        self.rows += 1
+        return self.rows - 1
+
+    def flush(self):
+        """
+        Save the rows buffered so far as the next chunk
+        """
+        if self.rows == 0:
+            return
+        for name, buffer in self.buffers.items():
+            path = os.path.join(self.directory, '%s-%04d.%s.npy' % (self.prefix, len(self.chunks), name))
+            _atomic_write(path, lambda f: np.save(f, buffer[:self.rows]))
+        self.chunks.append(self.rows)
+        self.rows = 0
+
+
+def _play_shard(task):
+    """
+    Worker entry point: play the games first..last-1 of a dataset and save their records as shard number shard
+    :return: (shard, number of records)
+    """
+    directory, shard, first, last, shooters, placements, seed, board_size, custom_ships, chunk_size = task
+    cells = board_size[0] * board_size[1]
+    writer = ChunkWriter(directory, 'shard-%06d' % shard, chunk_size, cells, DEFAULT_SHIPS + tuple(custom_ships))
+    b = writer.buffers
+    records = 0
+    for k in range(first, last):
+        game = start_game(shooters, placements, derive_seed(seed, k), board_size, custom_ships)
+        players = (game.player1, game.player2)
+        while not game.game_over:
+            attacker = game.turn % 2
+            shooter = shooters[attacker]
+            coordinate = shooter.choose_shot()
+            i = writer.row()
+            b['game'][i] = k
+            b['turn'][i] = game.turn
+            b['player'][i] = attacker
+            b['board'][i] = np.frombuffer(players[attacker].tracking_board.cells, dtype=np.uint8)
+            b['fleet'][i] = players[1 - attacker].my_board.fleet.life
+            b['shot'][i] = coordinate[1] * game.board_x + coordinate[0]
+            result = game.take_turn(coordinate)
+            b['outcome'][i] = SUNK if result.sunk is not None else HIT if result.hit else MISS
+            shooter.observe(result)
+            records += 1
+    writer.flush()
+    # the manifest is written last: a shard without one is replayed from scratch on resume
+    manifest = {'games': [first, last], 'records': records, 'chunks': writer.chunks}
+    _atomic_write(os.path.join(directory, 'shard-%06d.json' % shard),
+                  lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+    return shard, records
+
+
+class DatasetGenerator(object):
+    def __init__(self, directory, shooters, placements, games, board_size=(10, 10), custom_ships=(), seed=0,
+                 workers=None, games_per_shard=1000, chunk_size=65536):
+        """
+        Initializer for DatasetGenerator class. Plays self-play games and streams one record per shot (see COLUMNS) to
+            chunked columnar .npy files in a directory. Games are split into shards of games_per_shard games, each
+            played by one worker and saved as its own chunks, so a shard's files only depend on the seed and the
+            shard number: runs are reproducible whatever the number of workers, and an interrupted run resumes by
+            replaying the shards it did not finish.
+        :param directory: directory of the dataset, created if needed
+        :param shooters: (player1 Shooter, player2 Shooter) pair, pickled to the worker processes
+        :param placements: (player1 Placement, player2 Placement) pair, pickled to the worker processes
+        :param games: number of games of the dataset
+        :param board_size: board size of every game (2-tuple)
+        :param custom_ships: (name, dimensions) pairs added to the default fleet of every game
+        :param seed: dataset seed. Every game's seed is derived from it and the number of the game.
+        :param workers: number of worker processes, defaults to the number of cores. 0 plays every game in this process.
+        :param games_per_shard: number of games handed to a worker at once
+        :param chunk_size: number of records of every chunk file (the last chunk of a shard may be shorter)
+        """
+        if games_per_shard < 1 or chunk_size < 1:
+            raise ValueError("games_per_shard and chunk_size must be at least 1. You entered: %d and %d"
+                             % (games_per_shard, chunk_size))
+        self.directory = directory
+        self.shooters = tuple(shooters)
+        self.placements = tuple(placements)
+        self.games = games
+        self.board_size = tuple(board_size)
+        self.custom_ships = tuple((name, tuple(dimensions)) for name, dimensions in custom_ships)
+        self.seed = seed
+        self.workers = os.cpu_count() if workers is None else workers
+        self.games_per_shard = games_per_shard
+        self.chunk_size = chunk_size
+
+    def _metadata(self):
+        return {'board_size': list(self.board_size), 'custom_ships': [[n, list(d)] for n, d in self.custom_ships],
+                'seed': self.seed, 'games': self.games, 'games_per_shard': self.games_per_shard,
+                'chunk_size': self.chunk_size,
+                'columns': dict((name, np.dtype(dtype).str)
+                                for name, dtype in column_dtypes(DEFAULT_SHIPS + self.custom_ships).items()),
+                'strategies': [type(s).__name__ for s in self.shooters + self.placements]}
+
+    def _check_metadata(self):
+        """
+        Helper method writing dataset.json on the first run, and checking that a resumed run has the same settings
+        """
+        path = os.path.join(self.directory, 'dataset.json')
+        metadata = self._metadata()
+        if os.path.exists(path):
+            with open(path) as f:
+                existing = json.load(f)
+            if existing != metadata:
+                raise ValueError("%s holds a dataset generated with other settings: %s" % (self.directory, existing))
+        else:
+            _atomic_write(path, lambda f: f.write(json.dumps(metadata, indent=1).encode('utf-8')))
+
+    def shards(self):
+        """
+        :return: number of shards of the dataset
+        """
+        return (self.games + self.games_per_shard - 1) // self.games_per_shard
+
+    def _tasks(self):
+        for shard in range(self.shards()):
+            if os.path.exists(os.path.join(self.directory, 'shard-%06d.json' % shard)):
+                continue  # finished by a previous run
+            first = shard * self.games_per_shard
+            last = min(first + self.games_per_shard, self.games)
+            yield (self.directory, shard, first, last, self.shooters, self.placements, self.seed, self.board_size,
+                   self.custom_ships, self.chunk_size)
+
+    def run(self):
+        """
+        Play every game whose shard is not saved yet, spreading the shards over the worker processes
+        :return: number of records written by this run
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self._check_metadata()
+        tasks = self._tasks()
+        records = 0
+        if self.workers == 0:
+            for task in tasks:
+                records += _play_shard(task)[1]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(_play_shard, task) for task in tasks]
+                for future in as_completed(futures):
+                    records += future.result()[1]
+        return records
+
+
+class Dataset(object):
+    """
+    Read-only access to a dataset written by DatasetGenerator. Chunks are memory-mapped, so iterating over billions of
+        records only keeps the pages being read in memory.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'dataset.json')) as f:
+            self.metadata = json.load(f)
+        games_per_shard = self.metadata['games_per_shard']
+        shards = (self.metadata['games'] + games_per_shard - 1) // games_per_shard
+        self.chunks = list()  # (file prefix, number of records) of every chunk of the finished shards
+        for shard in range(shards):
+            path = os.path.join(directory, 'shard-%06d.json' % shard)
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                manifest = json.load(f)
+            self.chunks.extend(('shard-%06d-%04d' % (shard, k), rows) for k, rows in enumerate(manifest['chunks']))
+
+    def __len__(self):
+        return sum(rows for _, rows in self.chunks)
+
+    def chunk(self, k, columns=None):
+        """
+        :param k: index of the chunk in self.chunks
+        :param columns: names of the columns to load, None for every column
+        :return: dict column name -> read-only memory-mapped numpy array of the records of chunk k
+        """
+        prefix = self.chunks[k][0]
+        return dict((name, np.load(os.path.join(self.directory, '%s.%s.npy' % (prefix, name)), mmap_mode='r'))
+                    for name in (columns or COLUMNS))
+
+    def iter_chunks(self, columns=None):
+        """
+        Iterate over the chunks of the dataset, see .chunk()
+        """
+        for k in range(len(self.chunks)):
+            yield self.chunk(k, columns)
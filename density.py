@@ -0,0 +1,223 @@
+import heapq
+
+from game import DEFAULT, MISS, HIT, SUNK
+from strategies import Shooter
+
+HIT_WEIGHT = 32  # weight multiplier of a placement for every HIT cell it explains, steers the shooter to finish ships
+
+
+def _coverage(size, length):
+    """
+    :return: list, for every position along an axis of size cells, of the number of segments of the given length
+        inside the axis that cover it
+    """
+    n = size - length + 1
+    return [min(k, n - 1) - max(0, k - length + 1) + 1 for k in range(size)]
+
+
+class DensityShooter(Shooter):
+    """
+    Probability density targeting. Every placement of every ship still afloat that does not cross a MISS or SUNK cell
+        of the tracking board is counted, placements explaining HIT cells being weighted up by HIT_WEIGHT per hit, and
+        the unshot cell covered by the largest total weight is shot next. After a shot, only the placements crossing the
+        cells that changed are re-evaluated.
+    Placements are numbered shape by shape, row by row, so the placements crossing a cell are found by arithmetic and
+        no table of them is kept. Unshot cells are filed in buckets by total weight, with a heap of the weights, so a
+        move does not rescan the board.
+    """
+    def start(self, game, player, rng):
+        Shooter.start(self, game, player, rng)
+        board_x = game.board_x
+        board_y = game.board_y
+        self.board_x = board_x
+        self.board_y = board_y
+
+        # every orientation of every ship is a (width, height) shape, ships of the same size share their shapes
+        shapes = list()
+        self.ship_shapes = list()  # one ((shorter, longer) dimension, shape ids) entry per ship still afloat
+        for ship_name, dimension in game.ships:
+            longer_d = max(dimension)
+            shorter_d = min(dimension)
+            ids = list()
+            for shape in ((shorter_d, longer_d), (longer_d, shorter_d)):
+                if shape[0] > board_x or shape[1] > board_y:
+                    continue
+                if shape not in shapes:
+                    shapes.append(shape)
+                if shapes.index(shape) not in ids:
+                    ids.append(shapes.index(shape))
+            self.ship_shapes.append(((shorter_d, longer_d), ids))
+        self.shapes = shapes
+
+        self.multiplicity = [0] * len(shapes)  # number of ships afloat that can take each shape
+        for _, ids in self.ship_shapes:
+            for s in ids:
+                self.multiplicity[s] += 1
+
+        # placement (x, y) of shape s is number base[s] + y * (board_x - width + 1) + x
+        self.base = list()
+        n = 0
+        for w, h in shapes:
+            self.base.append(n)
+            n += (board_x - w + 1) * (board_y - h + 1)
+        self.blocked = [0] * n  # MISS or SUNK cells crossed by each placement
+        self.hits = [0] * n  # HIT cells crossed by each placement
+
+        # multiplicity weighted number of placements covering each cell, from the placements of each shape along x and y
+        total = [0] * (board_x * board_y)
+        for s, (w, h) in enumerate(shapes):
+            m = self.multiplicity[s]
+            columns = _coverage(board_x, w)
+            for y, rows in enumerate(_coverage(board_y, h)):
+                row = y * board_x
+                for x, c in enumerate(columns):
+                    total[row + x] += m * rows * c
+        self.total = total
+        self.known = bytearray(board_x * board_y)  # tracking board states already accounted for
+
+        # unshot cells filed by total weight: weight -> list of cells, and the heap of the weights (negated, with stale
+        # entries that are dropped when they come up)
+        self.buckets = dict()
+        self.weights = list()
+        self.slot = [-1] * (board_x * board_y)  # position of each unshot cell in its bucket, -1 for shot cells
+        self.filed = [0] * (board_x * board_y)  # weight each unshot cell is filed under
+        for i in range(board_x * board_y):
+            self._file(i)
+        self.windows = list()  # (x0, x1, y0, y1) rectangles of cells whose weight changed since they were filed
+        self.refile_all = False  # True when every cell may have changed, after a sink
+
+    def _file(self, i):
+        weight = self.total[i]
+        bucket = self.buckets.get(weight)
+        if bucket is None:
+            bucket = self.buckets[weight] = list()
+            heapq.heappush(self.weights, -weight)
+        self.slot[i] = len(bucket)
+        self.filed[i] = weight
+        bucket.append(i)
+
+    def _unfile(self, i):
+        weight = self.filed[i]
+        bucket = self.buckets[weight]
+        k = self.slot[i]
+        last = bucket.pop()
+        if last != i:
+            bucket[k] = last
+            self.slot[last] = k
+        if not bucket:
+            del self.buckets[weight]
+        self.slot[i] = -1
+
+    def _refile(self):
+        """
+        File again the unshot cells whose weight changed since they were filed
+        """
+        board_x = self.board_x
+        if self.refile_all:
+            self.windows = [(0, board_x - 1, 0, self.board_y - 1)]
+            self.refile_all = False
+        total = self.total
+        slot = self.slot
+        filed = self.filed
+        for x0, x1, y0, y1 in self.windows:
+            for y in range(y0, y1 + 1):
+                row = y * board_x
+                for i in range(row + x0, row + x1 + 1):
+                    if slot[i] >= 0 and total[i] != filed[i]:
+                        self._unfile(i)
+                        self._file(i)
+        self.windows = list()
+        if len(self.weights) > 2 * len(self.buckets) + 64:
+            self.weights = [-weight for weight in self.buckets]
+            heapq.heapify(self.weights)
+
+    def _update_cell(self, i, state):
+        """
+        Account for cell i of the tracking board changing to state
+        """
+        old = self.known[i]
+        if old == state:
+            return
+        self.known[i] = state
+        if old == DEFAULT:
+            self._unfile(i)
+        d_blocked = (state == MISS or state == SUNK) - (old == MISS or old == SUNK)
+        d_hits = (state == HIT) - (old == HIT)
+
+        board_x = self.board_x
+        board_y = self.board_y
+        cx = i % board_x
+        cy = i // board_x
+        blocked = self.blocked
+        hits = self.hits
+        total = self.total
+        max_w = 1
+        max_h = 1
+        for s, (w, h) in enumerate(self.shapes):
+            m = self.multiplicity[s]
+            if not m:
+                continue  # no ship afloat takes this shape any more, and none ever will again
+            max_w = max(max_w, w)
+            max_h = max(max_h, h)
+            nx = board_x - w + 1
+            base = self.base[s]
+            for y in range(max(0, cy - h + 1), min(cy, board_y - h) + 1):
+                for x in range(max(0, cx - w + 1), min(cx, nx - 1) + 1):
+                    p = base + y * nx + x
+                    before = 0 if blocked[p] else HIT_WEIGHT ** hits[p]
+                    blocked[p] += d_blocked
+                    hits[p] += d_hits
+                    delta = (0 if blocked[p] else HIT_WEIGHT ** hits[p]) - before
+                    if delta:
+                        change = m * delta
+                        for row in range(y * board_x, (y + h) * board_x, board_x):
+                            for c in range(row + x, row + x + w):
+                                total[c] += change
+        self.windows.append((max(0, cx - max_w + 1), min(board_x - 1, cx + max_w - 1),
+                             max(0, cy - max_h + 1), min(board_y - 1, cy + max_h - 1)))
+
+    def _ship_sunk(self, dimension):
+        """
+        Stop counting the placements of a sunk ship. Ships of the same dimensions share their shapes, so any of their
+            entries stands for the one sunk, whatever the ships' names.
+        """
+        dimension = (min(dimension), max(dimension))
+        for k, (d, ids) in enumerate(self.ship_shapes):
+            if d == dimension:
+                del self.ship_shapes[k]
+                board_x = self.board_x
+                blocked = self.blocked
+                hits = self.hits
+                total = self.total
+                for s in ids:
+                    self.multiplicity[s] -= 1
+                    w, h = self.shapes[s]
+                    nx = board_x - w + 1
+                    base = self.base[s]
+                    for y in range(self.board_y - h + 1):
+                        for x in range(nx):
+                            p = base + y * nx + x
+                            if blocked[p]:
+                                continue
+                            weight = HIT_WEIGHT ** hits[p]
+                            for row in range(y * board_x, (y + h) * board_x, board_x):
+                                for c in range(row + x, row + x + w):
+                                    total[c] -= weight
+                self.refile_all = True
+                return
+
+    def choose_shot(self):
+        self._refile()
+        weights = self.weights
+        while -weights[0] not in self.buckets:
+            heapq.heappop(weights)
+        i = self.rng.choice(self.buckets[-weights[0]])
+        return i % self.board_x, i // self.board_x
+
+    def observe(self, result):
+        tracking = self.player.tracking_board
+        self._update_cell(tracking.index(result.coordinate), tracking[result.coordinate])
+        if result.sunk is not None:
+            for c in result.sunk.coordinates:
+                self._update_cell(tracking.index(c), tracking[c])
+            self._ship_sunk(result.sunk.rectangle[2:])
@@ -0,0 +1,379 @@
+from game import DEFAULT, MISS, HIT, SUNK
+from placements import MASK_CELL_LIMIT, placement_index
+from density import DensityShooter
+from strategies import Shooter
+
+MAX_FLEETS = 64  # consistent fleets above which a position is left to the heuristic
+MAX_STATES = 1000  # new positions a search may memoize before it is abandoned
+NODE_BUDGET = 20  # partial fleets visited per allowed fleet while enumerating, before giving up
+
+
+class TooLarge(Exception):
+    """
+    Raised when a position has more consistent fleets or reachable states than the solver allows. fleets is the number
+        of consistent fleets of the position, or of those found before giving up on enumerating them.
+    """
+    def __init__(self, fleets):
+        Exception.__init__(self, "Position too large for the endgame solver (%d fleets)" % fleets)
+        self.fleets = fleets
+
+
+def surviving_ships(enemy):
+    """
+    :param enemy: the Player being shot at
+    :return: list of (name, dimensions) pairs of the ships of enemy that are still afloat (Ship.life > 0), the
+        dimensions being the width and height of the rectangle each ship covers
+    """
+    fleet = enemy.my_board.fleet
+    return [(fleet.names[k], (fleet.width[k], fleet.height[k])) for k in range(len(fleet)) if fleet.life[k] > 0]
+
+
+def _symmetries(board_x, board_y):
+    """
+    :return: list of cell permutations p of the symmetries of the board, board[p[i]] being cell i of the transformed
+        board. Every board has the identity, both flips and the half turn, square boards also have the quarter turns and
+        the diagonal flips.
+    """
+    def perm(f):
+        return tuple(f(i % board_x, i // board_x) for i in range(board_x * board_y))
+
+    mx = board_x - 1
+    my = board_y - 1
+    perms = [perm(lambda x, y: y * board_x + x),
+             perm(lambda x, y: y * board_x + mx - x),
+             perm(lambda x, y: (my - y) * board_x + x),
+             perm(lambda x, y: (my - y) * board_x + mx - x)]
+    if board_x == board_y:
+        perms += [perm(lambda x, y: x * board_x + y),
+                  perm(lambda x, y: x * board_x + mx - y),
+                  perm(lambda x, y: (mx - x) * board_x + y),
+                  perm(lambda x, y: (mx - x) * board_x + mx - y)]
+    return perms
+
+
+def _bits(mask):
+    return bin(mask).count("1")
+
+
+class Endgame(object):
+    """
+    Exact endgame solver. Every fleet of the ships still afloat that explains the tracking board is enumerated and
+        assumed equally likely, as with uniform random placement, and the shot minimizing the expected number of shots
+        left to sink them all is found by exhaustive search over the tracking boards the shots can lead to. The value of
+        a position is memoized under its canonical form (see _key), which merges the tracking boards that differ only
+        by cells no fleet can use any more and their mirror and rotated images, and the memo is kept between moves.
+        Shots are pruned by branch and bound (see _lower_bound). Positions with more than max_fleets consistent fleets,
+        or whose search adds more than max_states positions to the memo, raise TooLarge so that callers can fall back
+        to a heuristic.
+    """
+    def __init__(self, board_size, max_fleets=MAX_FLEETS, max_states=MAX_STATES):
+        """
+        :param board_size: (board_x, board_y) tuple, of at most MASK_CELL_LIMIT cells
+        :param max_fleets: largest number of consistent fleets a position may have
+        :param max_states: largest number of new positions a search may memoize, the memo is cleared once it holds more
+        """
+        if board_size[0] * board_size[1] > MASK_CELL_LIMIT:
+            raise ValueError("Endgame only supports boards of up to %d cells" % MASK_CELL_LIMIT)
+        self.board_x = board_size[0]
+        self.board_y = board_size[1]
+        self.max_fleets = max_fleets
+        self.max_states = max_states
+        self.symmetries = _symmetries(self.board_x, self.board_y)
+        self.memo = dict()  # canonical (tracking board, ships afloat) -> expected number of shots to finish
+        self.budget = max_states  # positions the running search may still add to the memo
+        self._placements = dict()  # dimensions -> every placement mask, square ships only once
+
+    def placements(self, dimension):
+        key = (min(dimension), max(dimension))
+        if key not in self._placements:
+            orientations = ('horizontal',) if key[0] == key[1] else ('vertical', 'horizontal')
+            masks = list()
+            for orientation in orientations:
+                masks.extend(placement_index((self.board_x, self.board_y), dimension, orientation).masks)
+            self._placements[key] = masks
+        return self._placements[key]
+
+    def fleets(self, cells, remaining):
+        """
+        Enumerate the placements of the ships afloat that avoid MISS and SUNK cells, cover every HIT cell and leave
+            every ship with at least one cell that was not shot (it would have been sunk otherwise)
+        :param cells: the tracking board cells
+        :param remaining: list of (name, dimensions) pairs of the ships afloat
+        :return: list of tuples of placement masks, one per ship of remaining
+        """
+        blocked = 0
+        hits = 0
+        for i, state in enumerate(cells):
+            if state == HIT:
+                hits |= 1 << i
+            elif state != DEFAULT:
+                blocked |= 1 << i
+        legal = [[m for m in self.placements(dimension) if not m & blocked and m & ~hits] for _, dimension in remaining]
+        # ships with the fewest placements first, so that dead ends are found early
+        order = sorted(range(len(remaining)), key=lambda s: len(legal[s]))
+        area = [0] * (len(order) + 1)  # cells covered by the ships from order[d] on
+        for d in range(len(order) - 1, -1, -1):
+            dimension = remaining[order[d]][1]
+            area[d] = area[d + 1] + dimension[0] * dimension[1]
+
+        fleets = list()
+        chosen = [0] * len(remaining)
+        budget = [NODE_BUDGET * self.max_fleets]
+
+        def extend(d, occupied):
+            budget[0] -= 1
+            if budget[0] < 0:
+                raise TooLarge(len(fleets))
+            if _bits(hits & ~occupied) > area[d]:
+                return
+            if d == len(order):
+                fleets.append(tuple(chosen))
+                if len(fleets) > self.max_fleets:
+                    raise TooLarge(len(fleets))
+                return
+            s = order[d]
+            for m in legal[s]:
+                if not m & occupied:
+                    chosen[s] = m
+                    extend(d + 1, occupied | m)
+
+        extend(0, 0)
+        return fleets
+
+    def _key(self, n_cells, open_cells, hits, ships):
+        """
+        Canonical form of a position. Cells no consistent fleet has a ship on are as good as MISS whatever their state,
+            so the board is reduced to HIT, open (some fleet has an unshot ship cell there) and closed cells before
+            taking the smallest of its images under the symmetries of the board.
+        :param ships: sorted tuple of the (name, dimensions) pairs of the ships afloat
+        """
+        board = bytes(HIT if hits >> i & 1 else DEFAULT if open_cells >> i & 1 else MISS for i in range(n_cells))
+        return min(bytes(map(board.__getitem__, p)) for p in self.symmetries), ships
+
+    def _split(self, fleets, alive, hits, bit):
+        """
+        Group fleets by what a shot at bit would show
+        :return: dict of outcome -> fleets, the outcome being None for a miss, -1 for a hit and (k, mask) when ship k,
+            covering mask, is sunk
+        """
+        outcomes = dict()
+        shot = hits | bit
+        for fleet in fleets:
+            outcome = None
+            for k in alive:
+                m = fleet[k]
+                if m & bit:
+                    outcome = (k, m) if not m & ~shot else -1
+                    break
+            outcomes.setdefault(outcome, list()).append(fleet)
+        return outcomes
+
+    def _outcomes(self, fleets, alive, hits, i):
+        """
+        :return: list of (fleets, alive, hits, sunk mask) tuples, the position after a shot at cell i for every outcome
+            the shot can have, sunk mask being 0 unless the shot sinks a ship
+        """
+        bit = 1 << i
+        outcomes = list()
+        for outcome, group in self._split(fleets, alive, hits, bit).items():
+            if outcome is None:
+                outcomes.append((group, alive, hits, 0))
+            elif outcome == -1:
+                outcomes.append((group, alive, hits | bit, 0))
+            else:
+                k, m = outcome
+                outcomes.append((group, tuple(a for a in alive if a != k), hits & ~m, m))
+        return outcomes
+
+    def _lower_bound(self, fleets, alive, hits, counts=None):
+        """
+        Every unshot ship cell takes a shot, and the shots before the next hit are misses: after j of them, at most j
+            times the largest hit count c of a cell fleets were ruled out, so with n fleets at least
+            sum(max(0, 1 - j * c / n)) misses are expected
+        :return: lower bound of the expected number of shots to finish
+        """
+        if not alive:
+            return 0.0
+        lower = sum(_bits(fleets[0][k]) for k in alive) - _bits(hits)
+        if len(fleets) == 1:
+            return float(lower)
+        if counts is None:
+            counts = self._hit_rates(fleets, alive, hits)[0]
+        n = len(fleets)
+        c = max(counts.values())
+        q = n // c
+        return lower + q - c * q * (q + 1) / (2.0 * n)
+
+    def _shot_value(self, cells, outcomes, names, i, n):
+        """
+        :return: expected number of shots to finish when cell i is shot next, given the outcomes of the shot
+        """
+        total = 0.0
+        for group, alive, hits, sunk in outcomes:
+            if not alive:
+                continue
+            if sunk:
+                covered = [j for j in range(len(cells)) if sunk >> j & 1]
+                for j in covered:
+                    cells[j] = SUNK
+                total += len(group) * self._value(cells, group, alive, names, hits)
+                for j in covered:
+                    cells[j] = HIT
+            else:
+                cells[i] = HIT if hits >> i & 1 else MISS
+                total += len(group) * self._value(cells, group, alive, names, hits)
+            cells[i] = DEFAULT
+        return 1.0 + total / n
+
+    def _hit_rates(self, fleets, alive, hits):
+        """
+        :return: (counts, open_cells) where counts is a dict of unshot cell -> number of fleets with a ship on it, for
+            the cells some fleet has a ship on, and open_cells the bitmask of those cells
+        """
+        counts = dict()
+        open_cells = 0
+        for fleet in fleets:
+            for k in alive:
+                m = fleet[k] & ~hits
+                open_cells |= m
+                while m:
+                    low = m & -m
+                    i = low.bit_length() - 1
+                    counts[i] = counts.get(i, 0) + 1
+                    m ^= low
+        return counts, open_cells
+
+    def _value(self, cells, fleets, alive, names, hits):
+        if len(fleets) == 1:
+            return self._lower_bound(fleets, alive, hits)
+        counts, open_cells = self._hit_rates(fleets, alive, hits)
+        key = self._key(len(cells), open_cells, hits, tuple(sorted(names[k] for k in alive)))
+        value = self.memo.get(key)
+        if value is not None:
+            return value
+        self.budget -= 1
+        if self.budget < 0:
+            raise TooLarge(len(fleets))
+
+        # shots are searched from the most promising lower bound on, until the bound of the next one cannot beat the
+        # best value found or the best value reaches the bound of the position
+        n = float(len(fleets))
+        lower = self._lower_bound(fleets, alive, hits, counts)
+        options = list()
+        for i in counts:
+            outcomes = self._outcomes(fleets, alive, hits, i)
+            bound = 1.0 + sum(len(o[0]) * self._lower_bound(*o[:3]) for o in outcomes) / n
+            options.append((bound, i, outcomes))
+        options.sort(key=lambda option: option[:2])
+        best = float('inf')
+        for bound, i, outcomes in options:
+            if bound >= best - 1e-12:
+                break
+            best = min(best, self._shot_value(cells, outcomes, names, i, n))
+            if best <= lower + 1e-12:
+                break
+        self.memo[key] = best
+        return best
+
+    def shot_values(self, cells, remaining, fleets=None):
+        """
+        Expected number of shots to finish for every useful shot of a position, e.g. to measure how far from optimal
+            the choices of a heuristic are. Cells no consistent fleet has a ship on are left out: they are sure misses.
+        :param cells: the tracking board cells, e.g. player.tracking_board.cells
+        :param remaining: list of (name, dimensions) pairs of the ships afloat, e.g. surviving_ships(enemy)
+        :param fleets: the consistent fleets if already enumerated by self.fleets(cells, remaining)
+        :return: dict of cell index -> expected shots to finish, this shot included. Empty when no ship is afloat.
+        :raises TooLarge: if the position is above the size limits
+        :raises ValueError: if no fleet explains the tracking board
+        """
+        if not remaining:
+            return dict()
+        if len(self.memo) >= self.max_states:
+            self.memo.clear()
+        self.budget = self.max_states
+        if fleets is None:
+            fleets = self.fleets(cells, remaining)
+        if not fleets:
+            raise ValueError("No placement of the ships afloat explains the tracking board")
+        hits = 0
+        for i, state in enumerate(cells):
+            if state == HIT:
+                hits |= 1 << i
+        alive = tuple(range(len(remaining)))
+        names = [(name, (min(dimension), max(dimension))) for name, dimension in remaining]
+        work = bytearray(cells)
+        return dict((i, self._shot_value(work, self._outcomes(fleets, alive, hits, i), names, i, len(fleets)))
+                    for i in self._hit_rates(fleets, alive, hits)[0])
+
+    def solve(self, cells, remaining):
+        """
+        :param cells: the tracking board cells
+        :param remaining: list of (name, dimensions) pairs of the ships afloat
+        :return: (expected shots to finish, (x, y) of the best shot), or None if the position is above the size limits
+        """
+        try:
+            values = self.shot_values(cells, remaining)
+        except TooLarge:
+            return None
+        if not values:
+            return 0.0, None
+        i = min(sorted(values), key=values.get)
+        return values[i], (i % self.board_x, i // self.board_x)
+
+
+class EndgameShooter(Shooter):
+    """
+    Plays the exact Endgame solution once the position is small enough, and a heuristic (a DensityShooter by default)
+        until then or whenever the solver gives up
+    """
+    def __init__(self, fallback=None, max_fleets=MAX_FLEETS, max_states=MAX_STATES):
+        """
+        :param fallback: Shooter used above the size limits
+        :param max_fleets: largest number of consistent fleets the solver takes on
+        :param max_states: largest number of new positions a search of the solver may memoize
+        """
+        self.fallback = fallback
+        self.max_fleets = max_fleets
+        self.max_states = max_states
+        self.solver = None
+
+    def start(self, game, player, rng):
+        Shooter.start(self, game, player, rng)
+        if player.tracking_board.sparse or game.board_x * game.board_y > MASK_CELL_LIMIT:
+            raise ValueError("EndgameShooter only supports dense boards of up to %d cells" % MASK_CELL_LIMIT)
+        if self.fallback is None:
+            self.fallback = DensityShooter()
+        self.fallback.start(game, player, rng)
+        self.remaining = list(game.ships)
+        if self.solver is None or (self.solver.board_x, self.solver.board_y) != (game.board_x, game.board_y):
+            self.solver = Endgame((game.board_x, game.board_y), self.max_fleets, self.max_states)
+        self.solved = 0  # shots chosen by the solver this game
+        self.retry_below = None  # number of fleets under which the solver is tried again after giving up
+
+    def choose_shot(self):
+        cells = self.player.tracking_board.cells
+        try:
+            fleets = self.solver.fleets(cells, self.remaining)
+            if self.retry_below is not None and len(fleets) >= self.retry_below:
+                return self.fallback.choose_shot()
+            values = self.solver.shot_values(cells, self.remaining, fleets)
+        except TooLarge as e:
+            # positions only get smaller, so the search is not attempted again before it has halved
+            self.retry_below = e.fleets // 2
+            return self.fallback.choose_shot()
+        except ValueError:
+            return self.fallback.choose_shot()
+        self.solved += 1
+        i = min(sorted(values), key=values.get)
+        return i % self.game.board_x, i // self.game.board_x
+
+    def observe(self, result):
+        self.fallback.observe(result)
+        if result.sunk is not None:
+            # matched on dimensions, as custom ships may share a name and same-sized ships are interchangeable here
+            width, height = result.sunk.rectangle[2:]
+            sunk = (min(width, height), max(width, height))
+            for k, (ship_name, dimension) in enumerate(self.remaining):
+                if (min(dimension), max(dimension)) == sunk:
+                    del self.remaining[k]
+                    break
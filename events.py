@@ -0,0 +1,42 @@
+class ShotResult(object):
+    """
+    Outcome of a single shot, returned by Game.take_turn() and Player.shoot_and_update_boards() and handed to every
+        listener registered with Game.add_listener()
+    """
+    __slots__ = ('turn', 'shooter', 'target', 'coordinate', 'hit', 'sunk', 'winner')
+
+    def __init__(self, shooter, target, coordinate, hit, sunk=None):
+        self.turn = None  # turn number of the shot, set by Game.take_turn()
+        self.shooter = shooter  # Player who fired
+        self.target = target  # Player who was shot at
+        self.coordinate = coordinate  # (x, y) tuple of the cell that was shot
+        self.hit = hit  # True if the shot hit a ship
+        self.sunk = sunk  # Ship sunk by this shot, None if no ship was sunk
+        self.winner = None  # Player who won the game with this shot, None if the game goes on
+
+    def __repr__(self):
+        return "ShotResult(turn=%r, shooter=%r, coordinate=%r, hit=%r, sunk=%r, winner=%r)" % (
+            self.turn, self.shooter, self.coordinate, self.hit, self.sunk, self.winner)
+
+
+class ConsoleListener(object):
+    """
+    Listener that prints the classic stdout messages for every shot, sink and game over.
+        E.g. game.add_listener(ConsoleListener())
+    """
+    def __call__(self, result):
+        shooter = result.shooter
+        target = result.target
+
+        print("\n%s's turn:" % shooter.name)
+
+        if result.hit:
+            ship = target.my_board.ship_at(result.coordinate)
+            print("%s hit %s's %s at %s" % (shooter.name, target.name, ship.name, str(result.coordinate)))
+            if result.sunk is not None:
+                print("%s's %s is sunk" % (target.name, result.sunk.name))
+        else:
+            print("%s's shot missed at %s" % (shooter.name, str(result.coordinate)))
+
+        if result.winner is not None:
+            print("\nGame Over: %s wins, %s loses\n" % (shooter.name, target.name))
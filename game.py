@@ -1,34 +1,53 @@
+from array import array
+from time import perf_counter
+
+from constants import DEFAULT, MISS, HIT, SUNK, OCCUPIED
 from player import *
+from events import ConsoleListener
+from snapshot import GAME_MAGIC, SnapshotReader, SnapshotWriter
 
-# CONSTANTS
-DEFAULT = 0  # represents cells that have not been shot
-MISS = 1  # represents cells that have missed shots
-HIT = 2  # represents cells that are occupied and have been shot
-SUNK = 3  # represents cells with sunken ships
-OCCUPIED = 4  # represents cells containing ships that have not been hit
+# Default fleet of (name, dimensions) pairs, can be expanded per game by .add_custom_ship() method
+DEFAULT_SHIPS = (("Carrier", (1, 5)),
+                 ("Battleship", (1, 4)),
+                 ("Submarine", (1, 3)),
+                 ("Cruiser", (1, 2)),
+                 ("Destroyer", (1, 2)))
 
 
 class Game(object):
-    def __init__(self, p1_name, p2_name, board_size=(10, 10)):
+    def __init__(self, p1_name, p2_name, board_size=(10, 10), sparse=False, salvo=1):
         """
         Initializer for Game class
         :param p1_name: player1's name (string)
         :param p2_name: player2's name (string)
         :param board_size: default size is 10 by 10 (2-tuple)
+        :param sparse: large-board mode (boolean). Ships are stored as rectangles and only shot cells are stored, so
+            that memory and per-shot cost grow with the number of ships and shots instead of the board area. Used for
+            boards far too large to hold one byte per cell, e.g. 100000 by 100000.
+        :param salvo: number of shots each player fires per turn. Salvo games (salvo > 1) are played with
+            .take_salvo() or .take_turns() instead of .take_turn().
         """
-        self.player1 = Player(p1_name, board_size)
-        self.player2 = Player(p2_name, board_size)
+        if salvo < 1:
+            raise ValueError("A turn must have at least 1 shot. You entered: %d" % salvo)
+        self.player1 = Player(p1_name, board_size, sparse)
+        self.player2 = Player(p2_name, board_size, sparse)
         self.board_x = board_size[0]
         self.board_y = board_size[1]
         self.turn = 0
         self.game_over = False
+        self.listeners = list()  # callables notified with the ShotResult of every turn, see .add_listener()
+        self.history = array('l')  # cell index (y * board_x + x) shot on each turn since history_start
+        self.history_start = 0  # first turn recorded in history, games restored from a snapshot start there
+        self.salvo = salvo
+        # end of each turn's shots in history (since history_start) for salvo games, None when every turn is one shot
+        self.volley_ends = None if salvo == 1 else array('l')
+        self.metrics = None  # Metrics collecting counters and latencies of every turn, see .set_metrics()
+        # 3 entries per move of .make_move() to undo: cell index shot, id of the ship hit (-1 on a miss), and the turn
+        # of the move times 2 plus 1 if the game was over before it
+        self.undo_stack = array('l')
 
         # Current default ships, can be expanded by .add_custom_ship() method
-        self.ships = [("Carrier", (1, 5)),
-                      ("Battleship", (1, 4)),
-                      ("Submarine", (1, 3)),
-                      ("Cruiser", (1, 2)),
-                      ("Destroyer", (1, 2))]
+        self.ships = list(DEFAULT_SHIPS)
 
     def add_custom_ship(self, ship_name, dimensions):
         """
@@ -40,6 +59,104 @@ class Game(object):
         """
         self.ships.append((ship_name, dimensions))
 
+    def clone(self):
+        """
+        Fast copy of the game for search and simulation. Both players' boards, ship lives and life counts are copied,
+            while ship layouts are shared (see FleetBoard.copy()). Listeners are not carried over to the clone.
+        :return: Game
+        """
+        game = Game.__new__(Game)
+        game.player1 = self.player1.copy()
+        game.player2 = self.player2.copy()
+        game.board_x = self.board_x
+        game.board_y = self.board_y
+        game.turn = self.turn
+        game.game_over = self.game_over
+        game.listeners = list()
+        game.history = array('l', self.history)
+        game.history_start = self.history_start
+        game.salvo = self.salvo
+        game.volley_ends = None if self.volley_ends is None else array('l', self.volley_ends)
+        game.ships = list(self.ships)
+        game.metrics = None
+        game.undo_stack = array('l', self.undo_stack)
+        return game
+
+    def to_bytes(self):
+        """
+        Serialize the game to the compact, versioned binary snapshot format described in snapshot.py. Listeners are
+            not saved.
+        :return: bytes
+        """
+        writer = SnapshotWriter()
+        writer.header(GAME_MAGIC)
+        writer.uint(self.turn)
+        writer.uint(1 if self.game_over else 0)
+        writer.uint(self.salvo)
+        writer.uint(len(self.ships))
+        for ship_name, dimensions in self.ships:
+            writer.string(ship_name)
+            writer.uint(dimensions[0])
+            writer.uint(dimensions[1])
+        self.player1._write(writer)
+        self.player2._write(writer)
+        return writer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Rebuild a game from the output of .to_bytes()
+        :param data: bytes-like snapshot
+        :return: Game
+        """
+        reader = SnapshotReader(data)
+        reader.header(GAME_MAGIC)
+        game = Game.__new__(cls)
+        game.turn = reader.uint()
+        game.game_over = reader.uint() == 1
+        game.salvo = reader.uint() if reader.version >= 3 else 1
+        game.ships = [(reader.string(), (reader.uint(), reader.uint())) for _ in range(reader.uint())]
+        game.player1 = Player._read(reader)
+        game.player2 = Player._read(reader)
+        reader.end()
+        game.board_x = game.player1.board_x
+        game.board_y = game.player1.board_y
+        game.listeners = list()
+        game.history = array('l')
+        game.history_start = game.turn
+        game.volley_ends = None if game.salvo == 1 else array('l')
+        game.metrics = None
+        game.undo_stack = array('l')
+        return game
+
+    def add_listener(self, listener):
+        """
+        Subscribe to the outcome of every turn. Nothing is printed by default, register a ConsoleListener to get the
+            classic stdout messages.
+        :param listener: callable taking the ShotResult of a turn as its only argument
+        :return: does not return
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+        Unsubscribe a listener previously registered with .add_listener()
+        :param listener: the callable to remove
+        :return: does not return
+        """
+        self.listeners.remove(listener)
+
+    def set_metrics(self, metrics):
+        """
+        Collect counters and per-phase latencies of every turn of this game (and of both players' shots) into metrics.
+            Clones and restored snapshots do not collect metrics until they get their own call.
+        :param metrics: a metrics.Metrics, which can be shared between games, or None to stop collecting
+        :return: does not return
+        """
+        self.metrics = metrics
+        self.player1.metrics = metrics
+        self.player2.metrics = metrics
+
     def initialize_ships(self, p1_pos_or, p2_pos_or):
         """
         Method to initialize player1 and player2 ships
@@ -64,10 +181,15 @@ class Game(object):
         """
         Method that actually 'plays' the game. This method automatically decides whose turn it is to place a shot.
             Thus, it only requires target coordinate as its function parameter. After every shot, this method checks if
-            the game is over.
+            the game is over. Listeners registered with .add_listener() are notified of the outcome.
         :param coord_to_shoot: target coordinate to shoot. (2-tuple of integers)
-        :return: does not return
+        :return: ShotResult holding the shot cell, whether it hit, the sunk ship (or None) and the winner (or None)
         """
+        if self.salvo != 1:
+            raise ValueError("Every turn of a salvo game is a volley of up to %d shots, use take_salvo()" % self.salvo)
+        metrics = self.metrics
+        if metrics is not None:
+            start = perf_counter()
         if self.turn % 2 == 0:
             attacker = self.player1
             receiver = self.player2
@@ -75,16 +197,191 @@ class Game(object):
             attacker = self.player2
             receiver = self.player1
 
-        print("\n%s's turn:" % attacker.name)
-
-        attacker.shoot_and_update_boards(receiver, coord_to_shoot)
+        result = attacker.shoot_and_update_boards(receiver, coord_to_shoot)
+        result.turn = self.turn
+        self.history.append(coord_to_shoot[1] * self.board_x + coord_to_shoot[0])
 
         self.turn += 1
 
         if receiver.is_dead():
-            print("\nGame Over: %s wins, %s loses\n" % (attacker.name, receiver.name))
+            result.winner = attacker
             self.game_over = True
 
+        if metrics is not None:
+            notify = perf_counter()
+        for listener in self.listeners:
+            listener(result)
+        if metrics is not None:
+            metrics.record_turn(start, notify, perf_counter(), result.winner is not None)
+        return result
+
+    def take_salvo(self, coords):
+        """
+        Play one turn of a salvo game: the attacker fires a volley of up to self.salvo shots. The volley is validated
+            as a whole (ranges, cells already shot, cells shot twice) before any shot is applied, then every shot is
+            resolved before the game over check, so a volley is never cut short. Listeners are notified of every shot
+            once the whole volley is resolved.
+        :param coords: sequence of target coordinates (2-tuples of integers)
+        :return: list of ShotResult, one per shot, sharing the same turn. The winner is set on the last result of the
+            volley that ended the game.
+        """
+        metrics = self.metrics
+        if metrics is not None:
+            start = perf_counter()
+        if self.turn % 2 == 0:
+            attacker = self.player1
+            receiver = self.player2
+        else:
+            attacker = self.player2
+            receiver = self.player1
+
+        indices = attacker._valid_volley(coords, self.salvo)
+        results = [attacker.shoot_and_update_boards(receiver, c, False) for c in coords]
+        for result in results:
+            result.turn = self.turn
+        self.history.extend(indices)
+        self._end_turn()
+
+        if receiver.is_dead():
+            results[-1].winner = attacker
+            self.game_over = True
+
+        if metrics is not None:
+            notify = perf_counter()
+        for result in results:
+            for listener in self.listeners:
+                listener(result)
+        if metrics is not None:
+            metrics.record_turn(start, notify, perf_counter(), self.game_over)
+        return results
+
+    def take_turns(self, coords):
+        """
+        Play a whole sequence of shots in one call, e.g. to replay a recorded game: one shot per turn, or volleys of
+            self.salvo shots per turn in salvo games (the last one may be shorter). Every shot of the sequence is
+            validated before any is applied, each player's shots being checked together, and play stops at game over:
+            the shots left are ignored. Listeners and metrics see every turn as with .take_turn() and .take_salvo();
+            without any, the shots are resolved without building ShotResult objects.
+        :param coords: sequence of target coordinates (2-tuples of integers), the players' turns alternating
+        :return: array('B') holding MISS, HIT or SUNK for every shot that was played
+        """
+        outcomes = array('B')
+        if self.game_over:
+            return outcomes
+        k = self.salvo
+        volleys = [coords[j:j + k] for j in range(0, len(coords), k)]
+        players = (self.player1, self.player2)
+        for p in range(2):
+            players[(self.turn + p) % 2]._valid_volley([c for volley in volleys[p::2] for c in volley])
+        if self.listeners or self.metrics is not None:
+            for volley in volleys:
+                results = self.take_salvo(volley) if k != 1 else [self.take_turn(volley[0])]
+                outcomes.extend(SUNK if r.sunk is not None else HIT if r.hit else MISS for r in results)
+                if self.game_over:
+                    break
+            return outcomes
+
+        board_x = self.board_x
+        history = self.history
+        for volley in volleys:
+            attacker = players[self.turn % 2]
+            receiver = players[1 - self.turn % 2]
+            for x, y in volley:
+                i = y * board_x + x
+                outcomes.append(attacker.fire(receiver, i))
+                history.append(i)
+            self._end_turn()
+            if receiver.life == 0:
+                self.game_over = True
+                break
+        return outcomes
+
+    def make_move(self, coord_to_shoot):
+        """
+        Play one turn in place for search, so that it can be reverted by .unmake_move(): the shot is validated and
+            applied like .take_turn() does, but listeners and metrics are skipped and no ShotResult is built. Only a
+            3-entry delta is pushed on self.undo_stack, everything else that changes (the cells rewritten by a sink,
+            the lives, the turn) follows from it.
+        :param coord_to_shoot: target coordinate to shoot. (2-tuple of integers)
+        :return: MISS, HIT or SUNK, the state of the shot cell on the attacker's tracking board afterwards
+        """
+        if self.salvo != 1:
+            raise ValueError("Moves of salvo games cannot be made one shot at a time")
+        if self.turn % 2 == 0:
+            attacker = self.player1
+            receiver = self.player2
+        else:
+            attacker = self.player2
+            receiver = self.player1
+        attacker._valid_shot(coord_to_shoot)
+        x, y = coord_to_shoot
+        i = y * self.board_x + x
+        ship_id = receiver.my_board.ship_id_at(x, y)
+        self.undo_stack.extend((i, ship_id, self.turn * 2 + (1 if self.game_over else 0)))
+        outcome = attacker.fire(receiver, i)
+        self.history.append(i)
+        self.turn += 1
+        if receiver.life == 0:
+            self.game_over = True
+        return outcome
+
+    def unmake_move(self):
+        """
+        Revert the last move of .make_move(), in time proportional to the number of cells it changed
+        :return: does not return
+        """
+        undo = self.undo_stack
+        if not undo:
+            raise ValueError("There is no move to unmake")
+        turn, game_over = divmod(undo[-1], 2)
+        if turn != self.turn - 1:
+            raise ValueError("The last move of turn %d was not made with make_move()" % (self.turn - 1))
+        i = undo[-3]
+        ship_id = undo[-2]
+        del undo[-3:]
+        self.history.pop()
+        self.turn = turn
+        self.game_over = game_over == 1
+        if turn % 2 == 0:
+            attacker = self.player1
+            receiver = self.player2
+        else:
+            attacker = self.player2
+            receiver = self.player1
+
+        board = receiver.my_board
+        if ship_id < 0:
+            attacker.tracking_board.restore(i, DEFAULT)
+            board.restore(i, DEFAULT)
+            return
+        fleet = board.fleet
+        if fleet.life[ship_id] == 0:
+            # the move sank the ship: its other cells go back from SUNK to HIT
+            x, y, width, height = fleet.rectangle(ship_id)
+            attacker.tracking_board.fill(x, y, width, height, HIT)
+            board.fill(x, y, width, height, HIT)
+        fleet.life[ship_id] += 1
+        receiver.life += 1
+        attacker.tracking_board.restore(i, DEFAULT)
+        board.restore(i, OCCUPIED)
+
+    def _end_turn(self):
+        """
+        Helper closing the current turn once its shots are in self.history
+        """
+        if self.volley_ends is not None:
+            self.volley_ends.append(len(self.history))
+        self.turn += 1
+
+    def _turn_shots(self, turn):
+        """
+        Helper listing the cell indices shot on a turn still in self.history
+        """
+        t = turn - self.history_start
+        if self.volley_ends is None:
+            return self.history[t:t + 1]
+        return self.history[self.volley_ends[t - 1] if t > 0 else 0:self.volley_ends[t]]
+
     def is_game_over(self):
         return self.game_over
 
@@ -104,6 +401,52 @@ class Game(object):
         """
         return self.player2.get_tracking_board_as_list(), self.player2.get_my_ships_as_list()
 
+    def get_player1_views(self):
+        """
+        Cached counterpart of .get_player1_boards(), see Board.rows(). Cheap to poll after every turn.
+        :return: (b1, b2) tuples of row tuples of player1's tracking board and of the board containing player1's ships
+        """
+        return self.player1.tracking_board.rows(), self.player1.my_board.rows()
+
+    def get_player2_views(self):
+        """
+        Cached counterpart of .get_player2_boards(), see Board.rows(). Cheap to poll after every turn.
+        :return: (b1, b2) tuples of row tuples of player2's tracking board and of the board containing player2's ships
+        """
+        return self.player2.tracking_board.rows(), self.player2.my_board.rows()
+
+    def changes_since(self, turn):
+        """
+        List the cells that changed from the start of a turn until now, so that clients can update their copy of the
+            boards without downloading them again
+        :param turn: turn number the client is up to date with, e.g. the turn returned by the previous call
+        :return: (current_turn, changes) where changes is a list of (player, board, (x, y), state) tuples giving the
+            current state of every changed cell. player is 1 or 2 and board is 'tracking' or 'ships'.
+        """
+        if turn < self.history_start or turn > self.turn:
+            raise ValueError("Changes are only known from turn %d to turn %d. You asked for turn %d."
+                             % (self.history_start, self.turn, turn))
+        players = (self.player1, self.player2)
+        changed = set()  # (number (0 or 1) of the player whose tracking board changed, cell index)
+        for t in range(turn, self.turn):
+            attacker = t % 2
+            for i in self._turn_shots(t):
+                changed.add((attacker, i))
+                if players[attacker].tracking_board.cells[i] == SUNK:
+                    # the ship was sunk after this shot, which rewrote all of its cells
+                    ship = players[1 - attacker].my_board.ship_at(players[attacker].tracking_board.coordinate(i))
+                    x, y, width, height = ship.rectangle
+                    for j in range(y, y + height):
+                        changed.update((attacker, j * self.board_x + k) for k in range(x, x + width))
+
+        changes = list()
+        for attacker, i in sorted(changed):
+            coordinate = (i % self.board_x, i // self.board_x)
+            state = players[attacker].tracking_board.cells[i]
+            changes.append((attacker + 1, 'tracking', coordinate, state))
+            changes.append((2 - attacker, 'ships', coordinate, state))
+        return self.turn, changes
+
     def pretty_print_player1_boards(self):
         """
         print ascii representation of player1's boards
@@ -127,6 +470,7 @@ class Game(object):
 if __name__ == "__main__":
     board_size = (10, 10)
     g = Game("John", "Sam", board_size)
+    g.add_listener(ConsoleListener())
     g.add_custom_ship("custom1", (2, 2))
     g.add_custom_ship("custom2", (1, 1))
 
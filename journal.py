@@ -0,0 +1,212 @@
+import mmap
+import os
+import struct
+
+from game import Game
+
+# Every record is RECORD.size (32) bytes: kind, player, length, game id, turn and an 18 byte payload
+RECORD = struct.Struct('<BBIII18s')
+SHOT_PAYLOAD = struct.Struct('<IIBi')  # x, y, outcome, index of the sunk ship in the target's fleet (-1 if none)
+PAYLOAD_SIZE = 18
+
+CHECKPOINT = 1  # game state at the start of a turn, followed by `length` DATA records holding Game.to_bytes()
+DATA = 2  # chunk of `length` bytes of the preceding checkpoint
+SHOT = 3  # one take_turn() call, `player` is the attacker (0 for player1, 1 for player2)
+
+MISSED = 0
+HIT_SHIP = 1
+SUNK_SHIP = 2
+GAME_OVER_FLAG = 0x80  # or-ed into the outcome of the shot that ended the game
+
+
+class JournalWriter(object):
+    """
+    Append-only journal of games. A game is recorded from the moment its ships are initialized through
+        .initialize_ships(), after which every take_turn() is appended as a fixed-size SHOT record. A full checkpoint
+        of the game is written at the turn recording starts and then every checkpoint_interval turns.
+    """
+    def __init__(self, path, checkpoint_interval=32):
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.next_game_id = 0
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with JournalReader(path) as reader:
+                games = reader.games()
+                if games:
+                    self.next_game_id = games[-1] + 1
+        self.file = open(path, 'ab')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def flush(self):
+        self.file.flush()
+
+    def initialize_ships(self, game, p1_pos_or, p2_pos_or):
+        """
+        Same as game.initialize_ships() but also starts recording the game, which gets the next game id of the journal
+        :param game: the Game to initialize and record
+        :return: id of the game in the journal
+        """
+        if game.salvo != 1:
+            raise ValueError("The journal records one shot per turn and cannot record salvo games")
+        game.initialize_ships(p1_pos_or, p2_pos_or)
+        game_id = self.next_game_id
+        self.next_game_id += 1
+        self.write_checkpoint(game_id, game)
+        game.add_listener(JournalRecorder(self, game_id, game))
+        return game_id
+
+    def write_checkpoint(self, game_id, game):
+        data = game.to_bytes()
+        chunks = [data[i:i + PAYLOAD_SIZE] for i in range(0, len(data), PAYLOAD_SIZE)]
+        records = [RECORD.pack(CHECKPOINT, 0, len(chunks), game_id, game.turn, b'')]
+        records.extend(RECORD.pack(DATA, 0, len(c), game_id, game.turn, c) for c in chunks)
+        self.file.write(b''.join(records))
+
+    def write_shot(self, game_id, result):
+        if result.sunk is not None:
+            outcome = SUNK_SHIP
+            sunk = result.sunk.ship_id
+        else:
+            outcome = HIT_SHIP if result.hit else MISSED
+            sunk = -1
+        if result.winner is not None:
+            outcome |= GAME_OVER_FLAG
+        x, y = result.coordinate
+        self.file.write(RECORD.pack(SHOT, result.turn % 2, 0, game_id, result.turn,
+                                    SHOT_PAYLOAD.pack(x, y, outcome, sunk)))
+
+
+class JournalRecorder(object):
+    """
+    Game listener appending every turn of one game to a JournalWriter, added by JournalWriter.initialize_ships()
+    """
+    def __init__(self, writer, game_id, game):
+        self.writer = writer
+        self.game_id = game_id
+        self.game = game
+
+    def __call__(self, result):
+        self.writer.write_shot(self.game_id, result)
+        if self.writer.checkpoint_interval and self.game.turn % self.writer.checkpoint_interval == 0:
+            self.writer.write_checkpoint(self.game_id, self.game)
+
+
+class JournalReader(object):
+    """
+    Memory-mapped reader of a journal written by JournalWriter. Records are read in place, nothing is parsed until it
+        is asked for.
+    """
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size % RECORD.size:
+            raise ValueError("%s is not a journal or has a truncated record" % path)
+        self.buf = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if isinstance(self.buf, mmap.mmap):
+            self.buf.close()
+        self.file.close()
+
+    def __len__(self):
+        return len(self.buf) // RECORD.size
+
+    def record(self, n):
+        """
+        :return: (kind, player, length, game_id, turn, payload) tuple of the n-th record
+        """
+        return RECORD.unpack_from(self.buf, n * RECORD.size)
+
+    def scan(self):
+        """
+        Iterate over every record of the journal in order
+        :return: iterator of (kind, player, length, game_id, turn, payload) tuples
+        """
+        return RECORD.iter_unpack(self.buf)
+
+    def _build_index(self):
+        """
+        One pass over the journal that records, per game, where its checkpoints and shots are
+        """
+        index = dict()
+        for n, (kind, player, length, game_id, turn, payload) in enumerate(self.scan()):
+            if kind == SHOT:
+                index[game_id][1].append(n)
+            elif kind == CHECKPOINT:
+                index.setdefault(game_id, ([], []))[0].append((turn, n))
+        self._index = index
+
+    def games(self):
+        """
+        :return: sorted list of the ids of the games in the journal
+        """
+        if self._index is None:
+            self._build_index()
+        return sorted(self._index)
+
+    def shots(self, game_id):
+        """
+        :return: list of (turn, attacker, (x, y), outcome, sunk ship index) tuples of a game, where attacker is 0 for
+            player1 and 1 for player2 and outcome is MISSED, HIT_SHIP or SUNK_SHIP, or-ed with GAME_OVER_FLAG on the
+            last shot of a finished game
+        """
+        if self._index is None:
+            self._build_index()
+        shots = list()
+        for n in self._index[game_id][1]:
+            kind, player, length, gid, turn, payload = self.record(n)
+            x, y, outcome, sunk = SHOT_PAYLOAD.unpack_from(payload)
+            shots.append((turn, player, (x, y), outcome, sunk))
+        return shots
+
+    def _checkpoint(self, n):
+        length = self.record(n)[2]
+        chunks = list()
+        for i in range(n + 1, n + 1 + length):
+            kind, player, size, game_id, turn, payload = self.record(i)
+            chunks.append(payload[:size])
+        return Game.from_bytes(b''.join(chunks))
+
+    def game_at(self, game_id, turn=None):
+        """
+        Rebuild a game as it was at the start of a turn, from the closest checkpoint at or before that turn and the
+            shots recorded after it
+        :param game_id: id of the game in the journal
+        :param turn: turn number, None for the last recorded state of the game
+        :return: Game
+        """
+        if self._index is None:
+            self._build_index()
+        if game_id not in self._index:
+            raise ValueError("Game %d is not in the journal" % game_id)
+        checkpoints, shot_records = self._index[game_id]
+        first = checkpoints[0][0]  # turn the recording started at, shot_records[0] is the shot of that turn
+        if turn is None:
+            turn = first + len(shot_records)
+        if turn < first or turn > first + len(shot_records):
+            raise ValueError("Game %d has turns %d to %d recorded, cannot rebuild turn %d"
+                             % (game_id, first, first + len(shot_records), turn))
+
+        start, n = max(c for c in checkpoints if c[0] <= turn)
+        game = self._checkpoint(n)
+        coords = list()
+        for n in shot_records[start - first:turn - first]:
+            x, y, outcome, sunk = SHOT_PAYLOAD.unpack_from(self.record(n)[5])
+            coords.append((x, y))
+        game.take_turns(coords)
+        return game
@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+import random
+import time
+
+from placements import sample_fleet
+from server import BattleshipClient, BattleshipServer
+
+
+async def play_match(creator, joiner, rng, latencies, board_size=(10, 10)):
+    """
+    Play one match between two clients (which may share a connection) with random placements and random shots
+    :param creator: BattleshipClient playing player1
+    :param joiner: BattleshipClient playing player2
+    :param rng: random.Random instance to draw from
+    :param latencies: list collecting the latency of every shoot request, in seconds
+    :return: number of shots fired
+    """
+    created = await creator.request('create', board_size=list(board_size))
+    match_id = created['match']
+    await joiner.request('join', match=match_id)
+    ships = [(name, tuple(d)) for name, d in created['ships']]
+
+    for client in (creator, joiner):
+        fleet = sample_fleet(ships, board_size, rng)
+        await client.request('place', match=match_id, placements=[[list(c), o] for c, o in fleet])
+
+    orders = list()
+    for _ in range(2):
+        cells = [[x, y] for y in range(board_size[1]) for x in range(board_size[0])]
+        rng.shuffle(cells)
+        orders.append(cells)
+
+    clients = (creator, joiner)
+    shots = 0
+    while True:
+        seat = shots % 2
+        start = time.perf_counter()
+        response = await clients[seat].request('shoot', match=match_id, coordinate=orders[seat].pop())
+        latencies.append(time.perf_counter() - start)
+        shots += 1
+        if response['result']['winner'] is not None:
+            return shots
+
+
+async def run(host, port, matches, connections, concurrency, seed):
+    server = None
+    if port is None:
+        # no server given, host one in this process so the load test runs on one machine
+        server = BattleshipServer('127.0.0.1', 0, max_matches=max(matches, 1))
+        await server.start()
+        host, port = '127.0.0.1', server.port
+
+    clients = [BattleshipClient() for _ in range(connections)]
+    for client in clients:
+        await client.connect(host, port)
+
+    latencies = list()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(k):
+        async with semaphore:
+            rng = random.Random("%d/%d" % (seed, k))
+            return await play_match(clients[k % connections], clients[(k + 1) % connections], rng, latencies)
+
+    start = time.perf_counter()
+    shots = sum(await asyncio.gather(*[one(k) for k in range(matches)]))
+    elapsed = time.perf_counter() - start
+
+    for client in clients:
+        await client.close()
+    if server is not None:
+        await server.close()
+
+    latencies.sort()
+    print("%d matches, %d shots in %.2fs: %.0f matches/s, %.0f shots/s" % (matches, shots, elapsed, matches / elapsed,
+                                                                            shots / elapsed))
+    if latencies:
+        print("shoot latency p50 %.2fms, p99 %.2fms, max %.2fms" % (1000 * latencies[len(latencies) // 2],
+                                                                   1000 * latencies[int(len(latencies) * 0.99)],
+                                                                   1000 * latencies[-1]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test a battleship server with concurrent random matches")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=None, help="server port, omit to host a server in this process")
+    parser.add_argument('--matches', type=int, default=1000, help="number of matches to play")
+    parser.add_argument('--connections', type=int, default=50, help="client connections the matches are spread over")
+    parser.add_argument('--concurrency', type=int, default=1000, help="matches in flight at once")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.connections < 2:
+        parser.error("the two players of a match need separate connections, use --connections 2 or more")
+
+    asyncio.run(run(args.host, args.port, args.matches, args.connections, args.concurrency, args.seed))
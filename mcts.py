@@ -0,0 +1,518 @@
+import math
+import random
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from game import DEFAULT, MISS, HIT, SUNK, OCCUPIED
+from player import Player
+from placements import MASK_CELL_LIMIT, placement_index
+from density import DensityShooter
+from strategies import Shooter
+
+ZOBRIST_SEED = 0  # every process derives the same Zobrist keys from it, so hashes can be compared between processes
+SAMPLE_ATTEMPTS = 200  # hidden fleets drawn before giving up on a tracking board that (almost) no fleet explains
+
+_worker_searches = dict()  # searches kept alive by each worker process between moves, see _search_task()
+
+
+class Zobrist(object):
+    """
+    Zobrist keys of the information a shooter has: one random 64-bit key per (cell, state) of the tracking board, 0 for
+        DEFAULT, and one per sunk ship. Ships of the same dimensions leave the same information when sunk, so sunk
+        ships are keyed by dimensions and rank, whatever their names. The hash of a tracking board is the XOR of the keys of its cells and of the
+        ships it sunk, so a shot only changes it by the keys of the cells it changed.
+    """
+    def __init__(self, n_cells, seed=ZOBRIST_SEED):
+        self.seed = seed
+        rng = random.Random(seed)
+        self.cells = [0] * (4 * n_cells)  # key of cell i in state s at 4 * i + s
+        for i in range(n_cells):
+            for state in (MISS, HIT, SUNK):
+                self.cells[4 * i + state] = rng.getrandbits(64)
+        self.ships = dict()
+
+    def ship(self, dimension, k):
+        """
+        :param dimension: (shorter, longer) dimensions of the ship
+        :return: key of the k-th (counting from 0) ship of these dimensions to be sunk
+        """
+        key = (dimension, k)
+        if key not in self.ships:
+            self.ships[key] = random.Random("%d/%d/%d/%d" % ((self.seed,) + dimension + (k,))).getrandbits(64)
+        return self.ships[key]
+
+    def board(self, cells, sunk):
+        """
+        Hash computed from scratch
+        :param cells: the tracking board's cells
+        :param sunk: dict of (shorter, longer) dimensions -> number of ships of those dimensions sunk
+        """
+        h = 0
+        keys = self.cells
+        for i, state in enumerate(cells):
+            h ^= keys[4 * i + state]
+        for dimension, n in sunk.items():
+            for k in range(n):
+                h ^= self.ship(dimension, k)
+        return h
+
+    def shot(self, h, cells, result, sunk):
+        """
+        Hash after a shot, from the hash before it
+        :param h: hash before the shot
+        :param cells: the tracking board's cells after the shot
+        :param result: ShotResult of the shot
+        :param sunk: dict of (shorter, longer) dimensions -> number of ships of those dimensions sunk before the shot,
+            updated in place
+        :return: hash after the shot
+        """
+        keys = self.cells
+        x, y = result.coordinate
+        board_x = result.shooter.board_x
+        i = y * board_x + x
+        h ^= keys[4 * i + cells[i]]
+        if result.sunk is not None:
+            for c in result.sunk.coordinates:
+                j = c[1] * board_x + c[0]
+                if j != i:
+                    h ^= keys[4 * j + HIT] ^ keys[4 * j + SUNK]
+            width, height = result.sunk.rectangle[2:]
+            dimension = (min(width, height), max(width, height))
+            k = sunk.get(dimension, 0)
+            h ^= self.ship(dimension, k)
+            sunk[dimension] = k + 1
+        return h
+
+
+class TranspositionTable(object):
+    """
+    Bounded map of Zobrist hash -> search node. Once capacity is reached the least recently used node is evicted.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        node = self.entries.get(key)
+        if node is not None:
+            self.entries.move_to_end(key)
+        return node
+
+    def put(self, key, node):
+        self.entries[key] = node
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+
+class Node(object):
+    """
+    Statistics of one tracking board state. Its shots are tried once each, in random order, before UCB1 picks among
+        them.
+    """
+    __slots__ = ('visits', 'actions', 'untried')
+
+    def __init__(self, untried):
+        self.visits = 0
+        self.actions = dict()  # cell index -> [visits, total reward]
+        self.untried = untried  # cell indices not tried yet
+
+
+class Search(object):
+    """
+    Determinized Monte Carlo tree search over one player's shots. Each iteration draws a hidden enemy fleet that
+        explains the tracking board, replays it on copies of Player objects with the engine's own
+        shoot_and_update_boards(), descends the tree of tracking board states and continues with a hunt and target
+        rollout. The root picks its shots with PUCT, the prior of a shot being its hit probability over the hidden
+        fleets, and deeper nodes with UCB1. The return of a shot is the discounted number of hits of the next `horizon`
+        shots, which favours finding ships early (fewer shots to win) with much less noise than counting the shots to
+        the end of the game. Nodes live in a TranspositionTable keyed by Zobrist hash, and survive between moves.
+    """
+    def __init__(self, board_size, ships, table_size=200000, exploration=0.5, pool_size=64, horizon=5, discount=0.6):
+        """
+        :param board_size: (board_x, board_y) tuple, of at most MASK_CELL_LIMIT cells
+        :param ships: list of (name, dimensions) pairs of the enemy fleet, e.g. Game.ships
+        :param table_size: number of nodes kept by the transposition table
+        :param exploration: PUCT and UCB1 exploration constant
+        :param pool_size: number of hidden fleets drawn per move, iterations beyond it reuse them
+        :param horizon: number of shots (tree and rollout) an iteration looks ahead
+        :param discount: weight of a hit one shot later relative to a hit now
+        """
+        if board_size[0] * board_size[1] > MASK_CELL_LIMIT:
+            raise ValueError("Search only supports boards of up to %d cells" % MASK_CELL_LIMIT)
+        self.board_x = board_size[0]
+        self.board_y = board_size[1]
+        self.ships = list(ships)
+        self.exploration = exploration
+        self.pool_size = pool_size
+        self.horizon = horizon
+        self.discount = discount
+        self.zobrist = Zobrist(self.board_x * self.board_y)
+        self.table = TranspositionTable(table_size)
+
+        # every placement of every ship as (mask, coordinate, orientation), square ships only once, by ship index
+        self.placements = list()
+        for ship_name, dimension in self.ships:
+            orientations = ('horizontal',) if dimension[0] == dimension[1] else ('vertical', 'horizontal')
+            options = list()
+            for orientation in orientations:
+                index = placement_index(board_size, dimension, orientation)
+                options.extend((index.masks[k], index.coordinate(k), orientation) for k in range(len(index)))
+            self.placements.append(options)
+
+    def _masks(self, cells):
+        """
+        :return: (blocked, hits) bitmasks of the MISS or SUNK cells and of the HIT cells of a tracking board
+        """
+        blocked = 0
+        hits = 0
+        for i, state in enumerate(cells):
+            if state == HIT:
+                hits |= 1 << i
+            elif state != DEFAULT:
+                blocked |= 1 << i
+        return blocked, hits
+
+    def _sample_fleet(self, remaining, blocked, hits, rng):
+        """
+        Draw the placements of the ships still afloat so that they avoid MISS and SUNK cells, cover every HIT cell
+            and leave every ship with at least one cell that was not shot (it would have been sunk otherwise). HIT cells
+            are covered first, lowest cell first, by a random ship placed at random over it, and the other ships are
+            placed at random. This favours fleets that explain the hits with many ships, so every fleet comes with its
+            importance weight, the inverse of its probability of being drawn: resampling by weight makes every
+            consistent fleet equally likely.
+        :param remaining: indices in self.ships of the ships still afloat
+        :return: (fleet, weight) where fleet is a list of (coordinate, orientation) tuples, one per ship of remaining,
+            or (None, 0) if no fleet was found
+        """
+        legal = [[p for p in self.placements[s] if not p[0] & blocked and p[0] & ~hits] for s in remaining]
+        n = len(remaining)
+        for _ in range(SAMPLE_ATTEMPTS):
+            chosen = [None] * n
+            weight = 1.0
+            occupied = 0
+            uncovered = hits
+            while uncovered:
+                bit = uncovered & -uncovered
+                options = [(s, p) for s in range(n) if chosen[s] is None
+                           for p in legal[s] if p[0] & bit and not p[0] & occupied]
+                if not options:
+                    break
+                s, p = rng.choice(options)
+                weight *= len(options)
+                chosen[s] = p
+                occupied |= p[0]
+                uncovered &= ~p[0]
+            if uncovered:
+                continue
+            for s in range(n):
+                if chosen[s] is None:
+                    free = occupied | hits
+                    options = [p for p in legal[s] if not p[0] & free]
+                    if not options:
+                        break
+                    p = rng.choice(options)
+                    weight *= len(options)
+                    chosen[s] = p
+                    occupied |= p[0]
+            else:
+                return [(p[1], p[2]) for p in chosen], weight
+        return None, 0
+
+    def _hidden_enemy(self, cells, remaining, fleet):
+        """
+        :return: a Player holding a hidden fleet, with the shots of the tracking board applied to its board
+        """
+        enemy = Player("hidden", (self.board_x, self.board_y))
+        for s, (coordinate, orientation) in zip(remaining, fleet):
+            ship_name, dimension = self.ships[s]
+            enemy.place_ship(ship_name, orientation, dimension, coordinate)
+        board = enemy.my_board
+        for i, state in enumerate(cells):
+            if state == HIT:
+                enemy.receive_damage(board.coordinate(i))
+            elif state != DEFAULT:
+                board.cells[i] = state
+        return enemy
+
+    def _candidates(self, cells, parity, rng):
+        """
+        Shots worth trying from a tracking board: the unshot neighbours of HIT cells if there are any, else the
+            unshot cells of one checkerboard colour when every ship afloat is at least 2 cells long
+        :return: list of cell indices in random order
+        """
+        board_x = self.board_x
+        targets = set()
+        for i, state in enumerate(cells):
+            if state == HIT:
+                x = i % board_x
+                y = i // board_x
+                for j in ((i - 1) if x > 0 else -1, (i + 1) if x < board_x - 1 else -1,
+                          (i - board_x) if y > 0 else -1, (i + board_x) if y < self.board_y - 1 else -1):
+                    if j >= 0 and cells[j] == DEFAULT:
+                        targets.add(j)
+        if targets:
+            candidates = list(targets)
+        else:
+            candidates = [i for i, state in enumerate(cells) if state == DEFAULT]
+            if parity:
+                even = [i for i in candidates if (i % board_x + i // board_x) % 2 == 0]
+                candidates = even or candidates
+        rng.shuffle(candidates)
+        return candidates
+
+    def _rollout(self, me, enemy, rng, parity, hits):
+        """
+        Keep shooting with a random hunt and target policy until the horizon or the end of the game
+        :param hits: list of whether each shot of the iteration hit, extended in place
+        :return: does not return
+        """
+        board_x = self.board_x
+        cells = me.tracking_board.cells
+        hunt = [i for i, state in enumerate(cells) if state == DEFAULT]
+        rng.shuffle(hunt)
+        if parity:
+            # popped from the end, so the cells of one checkerboard colour come first
+            hunt.sort(key=lambda i: (i % board_x + i // board_x) % 2)
+        targets = self._candidates(cells, False, rng) if HIT in cells else list()
+        while len(hits) < self.horizon and not enemy.is_dead():
+            while targets and cells[targets[-1]] != DEFAULT:
+                targets.pop()
+            if targets:
+                i = targets.pop()
+            else:
+                i = hunt.pop()
+                while cells[i] != DEFAULT:
+                    i = hunt.pop()
+            x = i % board_x
+            y = i // board_x
+            result = me.shoot_and_update_boards(enemy, (x, y))
+            hits.append(result.hit)
+            if result.sunk is not None:
+                if HIT not in cells:
+                    targets = list()
+            elif result.hit:
+                for j in ((i - 1) if x > 0 else -1, (i + 1) if x < board_x - 1 else -1,
+                          (i - board_x) if y > 0 else -1, (i + board_x) if y < self.board_y - 1 else -1):
+                    if j >= 0 and cells[j] == DEFAULT:
+                        targets.append(j)
+
+    def run(self, cells, remaining, sunk, root_hash, candidates, budget, rng):
+        """
+        Search from a tracking board for `budget` seconds
+        :param cells: the tracking board's cells
+        :param remaining: indices in self.ships of the enemy ships still afloat
+        :param sunk: dict of (shorter, longer) dimensions -> number of ships of those dimensions sunk
+        :param root_hash: Zobrist hash of the tracking board and sunk ships
+        :param candidates: cell indices the root may shoot
+        :param budget: seconds to search for
+        :param rng: random.Random instance to draw from
+        :return: dict of cell index -> [visits, total reward] of the root's shots, empty if no hidden fleet explains
+            the tracking board
+        """
+        deadline = time.perf_counter() + budget
+        me = Player("search", (self.board_x, self.board_y))
+        me.tracking_board.cells[:] = cells
+        parity = all(max(self.ships[s][1]) >= 2 for s in remaining)
+        scale = (1.0 - self.discount) / (1.0 - self.discount ** self.horizon)  # keeps returns within [0, 1]
+        blocked, hit_mask = self._masks(cells)
+
+        root = self.table.get(root_hash)
+        if root is None:
+            root = Node(list())
+            self.table.put(root_hash, root)
+
+        # hidden fleets, drawn then resampled by importance weight so that they follow the posterior
+        fleets = list()
+        weights = list()
+        for _ in range(self.pool_size):
+            fleet, weight = self._sample_fleet(remaining, blocked, hit_mask, rng)
+            if fleet is None:
+                break
+            fleets.append(fleet)
+            weights.append(weight)
+        if not fleets:
+            return dict()
+        enemies = dict()
+        pool = list()
+        for k in rng.choices(range(len(fleets)), weights, k=self.pool_size):
+            if k not in enemies:
+                enemies[k] = self._hidden_enemy(cells, remaining, fleets[k])
+            pool.append(enemies[k])
+
+        # prior of the root's shots: how often they hit in the pool, i.e. their posterior hit probability
+        prior = dict()
+        for i in set(candidates) | set(root.actions):
+            prior[i] = sum(1 for enemy in pool if enemy.my_board.cells[i] == OCCUPIED) / float(len(pool))
+        total = sum(prior.values()) or 1.0
+        for i in prior:
+            prior[i] /= total
+
+        iterations = 0
+        while iterations == 0 or time.perf_counter() < deadline:
+            iterations += 1
+            enemy = rng.choice(pool).copy()
+            player = me.copy()
+            tracking = player.tracking_board.cells
+            h = root_hash
+            sunk_now = dict(sunk)
+
+            node = root
+            path = list()
+            hits = list()
+            while True:
+                if node is root:
+                    # PUCT, so that the search starts from the likeliest hits and only leaves them on evidence
+                    sqrt_n = math.sqrt(root.visits + 1)
+                    c = self.exploration
+                    actions = root.actions
+                    i = max(prior, key=lambda a: (actions[a][1] / actions[a][0] if a in actions else 0.0) +
+                            c * prior[a] * sqrt_n / (1 + (actions[a][0] if a in actions else 0)))
+                elif node.untried:
+                    i = node.untried.pop()
+                else:
+                    log_n = math.log(node.visits)
+                    c = self.exploration
+                    i = max(node.actions, key=lambda a: node.actions[a][1] / node.actions[a][0] +
+                            c * math.sqrt(log_n / node.actions[a][0]))
+                path.append((node, i))
+                result = player.shoot_and_update_boards(enemy, (i % self.board_x, i // self.board_x))
+                hits.append(result.hit)
+                h = self.zobrist.shot(h, tracking, result, sunk_now)
+                if enemy.is_dead():
+                    break
+                child = self.table.get(h)
+                if child is None:
+                    self.table.put(h, Node(self._candidates(tracking, parity, rng)))
+                    self._rollout(player, enemy, rng, parity, hits)
+                    break
+                node = child
+
+            # discounted return from each node of the path, computed backwards from the last shot
+            returns = [0.0] * (len(hits) + 1)
+            for t in range(len(hits) - 1, -1, -1):
+                returns[t] = hits[t] + self.discount * returns[t + 1]
+            for depth, (node, i) in enumerate(path):
+                reward = scale * returns[depth]
+                node.visits += 1
+                stats = node.actions.get(i)
+                if stats is None:
+                    node.actions[i] = [1, reward]
+                else:
+                    stats[0] += 1
+                    stats[1] += reward
+        return dict((i, list(stats)) for i, stats in root.actions.items())
+
+
+def _search_task(settings, cells, remaining, sunk, root_hash, candidates, budget, seed):
+    """
+    Run a Search in a worker process. Each worker keeps its Search, and so its transposition table, between moves.
+    :param settings: arguments of Search()
+    """
+    key = (tuple(settings[0]), tuple(settings[1])) + tuple(settings[2:])
+    if key not in _worker_searches:
+        _worker_searches[key] = Search(*settings)
+    return _worker_searches[key].run(cells, remaining, sunk, root_hash, candidates, budget, random.Random(seed))
+
+
+class MCTSShooter(Shooter):
+    """
+    Monte Carlo tree search targeting, see Search. The root considers the cells ranked highest by a DensityShooter
+        (plus the ones searched before from the same tracking board), and the DensityShooter is played when no hidden
+        fleet explains the tracking board. With workers > 1, that many processes search independently for the whole
+        time budget (root parallelization) and their root statistics are summed.
+    Experimental: at the default settings it only ties DensityShooter on shots per game while being far slower, so
+        DensityShooter remains the better choice.
+    """
+    def __init__(self, time_budget=0.1, workers=0, table_size=200000, exploration=0.5, candidates=12, pool_size=64,
+                 horizon=5, discount=0.6):
+        """
+        :param time_budget: seconds of search per shot
+        :param workers: number of worker processes, 0 or 1 to search in this process
+        :param table_size: number of nodes kept by the transposition table (of each worker)
+        :param exploration: PUCT and UCB1 exploration constant
+        :param candidates: number of cells the root considers
+        :param pool_size: number of hidden fleets drawn per move
+        :param horizon: number of shots an iteration looks ahead
+        :param discount: weight of a hit one shot later relative to a hit now
+        """
+        self.time_budget = time_budget
+        self.workers = workers
+        self.table_size = table_size
+        self.exploration = exploration
+        self.candidates = candidates
+        self.pool_size = pool_size
+        self.horizon = horizon
+        self.discount = discount
+        self.executor = None
+        self.search = None
+
+    def __getstate__(self):
+        # the worker pool stays with the process that created it
+        state = dict(self.__dict__)
+        state['executor'] = None
+        return state
+
+    def close(self):
+        """
+        Shut the worker processes down, they are started again by the next search
+        :return: does not return
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def start(self, game, player, rng):
+        Shooter.start(self, game, player, rng)
+        if player.tracking_board.sparse or game.board_x * game.board_y > MASK_CELL_LIMIT:
+            raise ValueError("MCTSShooter only supports dense boards of up to %d cells" % MASK_CELL_LIMIT)
+        self.density = DensityShooter()
+        self.density.start(game, player, rng)
+        self.remaining = list(range(len(game.ships)))  # indices in game.ships (and ship ids) of the ships afloat
+        self.sunk = dict()
+        if self.search is None or self.search.ships != game.ships or \
+                (self.search.board_x, self.search.board_y) != (game.board_x, game.board_y):
+            self.search = Search(*self._settings())
+        self.hash = self.search.zobrist.board(player.tracking_board.cells, self.sunk)
+
+    def _settings(self):
+        return ((self.game.board_x, self.game.board_y), list(self.game.ships), self.table_size, self.exploration,
+                self.pool_size, self.horizon, self.discount)
+
+    def choose_shot(self):
+        cells = self.player.tracking_board.cells
+        known = self.density.known
+        total = self.density.total
+        ranked = sorted((i for i in range(len(total)) if known[i] == DEFAULT), key=lambda i: -total[i])
+        candidates = ranked[:self.candidates]
+        self.rng.shuffle(candidates)
+
+        if self.workers > 1:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(self.workers)
+            args = (self._settings(), bytes(cells), self.remaining, self.sunk, self.hash, candidates, self.time_budget)
+            futures = [self.executor.submit(_search_task, *(args + (self.rng.getrandbits(64),)))
+                       for _ in range(self.workers)]
+            stats = dict()
+            for future in futures:
+                for i, (n, w) in future.result().items():
+                    total_stats = stats.setdefault(i, [0, 0.0])
+                    total_stats[0] += n
+                    total_stats[1] += w
+        else:
+            stats = self.search.run(cells, self.remaining, self.sunk, self.hash, candidates, self.time_budget, self.rng)
+
+        if not stats:
+            return self.density.choose_shot()
+        i = max(stats, key=lambda a: (stats[a][0], stats[a][1]))
+        return i % self.game.board_x, i // self.game.board_x
+
+    def observe(self, result):
+        self.density.observe(result)
+        self.hash = self.search.zobrist.shot(self.hash, self.player.tracking_board.cells, result, self.sunk)
+        if result.sunk is not None:
+            # ships are placed in the order of game.ships, so a ship's id is its index there
+            self.remaining.remove(result.sunk.ship_id)
@@ -0,0 +1,165 @@
+from bisect import bisect_left
+
+# Upper bounds (in seconds) of the latency histogram buckets, from 1us to 1s. A last bucket holds everything above.
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 0.1, 1.0)
+
+PHASES = ('validate', 'board_update', 'sink_update', 'listeners', 'turn')
+COUNTERS = ('shots', 'hits', 'sinks', 'games_over')
+
+_HELP = {
+    'shots': "Shots resolved by Player.shoot_and_update_boards()",
+    'hits': "Shots that hit a ship",
+    'sinks': "Shots that sunk a ship",
+    'games_over': "Games won by the shot that ended them",
+    'validation_failures': "Shots rejected by Player._valid_shot() and Player._valid_volley(), by reason",
+    'phase_seconds': "Latency of the phases of a turn: validate, board_update and sink_update inside "
+                     "Player.shoot_and_update_boards(), listeners and the whole turn inside Game.take_turn()",
+}
+
+
+class Histogram(object):
+    """
+    Fixed-bucket histogram, counts[k] being the number of values <= bounds[k] and > bounds[k - 1]
+    """
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        if other.bounds != self.bounds:
+            raise ValueError("Cannot merge histograms with different buckets")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def cumulative(self):
+        """
+        :return: list of (upper bound, number of values <= upper bound) pairs, the last bound being float('inf')
+        """
+        total = 0
+        buckets = list()
+        for bound, n in zip(self.bounds + (float('inf'),), self.counts):
+            total += n
+            buckets.append((bound, total))
+        return buckets
+
+
+class Metrics(object):
+    """
+    Counters and per-phase latency histograms of the turn pipeline. Collection is off unless a Metrics is attached to
+        a game with game.set_metrics(metrics), and a detached game only pays one `is None` test per hook. One Metrics
+        may be shared by any number of games, e.g. all the matches of a server.
+    """
+    def __init__(self):
+        self.counters = dict((name, 0) for name in COUNTERS)
+        self.validation_failures = dict()  # reason -> number of rejected shots
+        self.phases = dict((name, Histogram()) for name in PHASES)
+
+    def reset(self):
+        self.__init__()
+
+    def merge(self, other):
+        """
+        Add the counts of another Metrics to this one, e.g. to aggregate the metrics of several processes
+        :return: does not return
+        """
+        for name, n in other.counters.items():
+            self.counters[name] += n
+        for reason, n in other.validation_failures.items():
+            self.validation_failures[reason] = self.validation_failures.get(reason, 0) + n
+        for name, histogram in other.phases.items():
+            self.phases[name].merge(histogram)
+
+    def record_invalid_shot(self, reason):
+        self.validation_failures[reason] = self.validation_failures.get(reason, 0) + 1
+
+    def record_shot(self, hit, start, validated, sink_start, end):
+        """
+        Called by Player.shoot_and_update_boards() with perf_counter() readings taken along the shot
+        :param hit: whether the shot hit a ship
+        :param start: before validation
+        :param validated: after validation
+        :param sink_start: before the sunk ship's cells were updated, None if no ship was sunk
+        :param end: after the boards were updated
+        """
+        counters = self.counters
+        counters['shots'] += 1
+        phases = self.phases
+        phases['validate'].observe(validated - start)
+        if hit:
+            counters['hits'] += 1
+        if sink_start is None:
+            phases['board_update'].observe(end - validated)
+        else:
+            counters['sinks'] += 1
+            phases['board_update'].observe(sink_start - validated)
+            phases['sink_update'].observe(end - sink_start)
+
+    def record_turn(self, start, notify, end, game_over):
+        """
+        Called by Game.take_turn() with perf_counter() readings taken along the turn
+        :param start: at the start of the turn
+        :param notify: before the listeners were called
+        :param end: after the listeners were called
+        :param game_over: whether the turn ended the game
+        """
+        self.phases['listeners'].observe(end - notify)
+        self.phases['turn'].observe(end - start)
+        if game_over:
+            self.counters['games_over'] += 1
+
+    def snapshot(self):
+        """
+        :return: dict of plain values, e.g. {'counters': {'shots': 120, ...}, 'validation_failures': {'repeated': 2},
+            'phases': {'validate': {'count': 120, 'sum': 0.0001, 'buckets': [[1e-06, 97], ..., ['+Inf', 120]]}, ...}}
+            where buckets are cumulative (upper bound, count) pairs as in Prometheus
+        """
+        return {
+            'counters': dict(self.counters),
+            'validation_failures': dict(self.validation_failures),
+            'phases': dict((name, {'count': h.count, 'sum': h.sum,
+                                   'buckets': [['+Inf' if b == float('inf') else b, n] for b, n in h.cumulative()]})
+                           for name, h in self.phases.items()),
+        }
+
+    def to_prometheus(self, prefix='battleship'):
+        """
+        :param prefix: prefix of the metric names
+        :return: the metrics in the Prometheus text exposition format
+        """
+        lines = list()
+        for name in COUNTERS:
+            metric = "%s_%s_total" % (prefix, name)
+            lines.append("# HELP %s %s" % (metric, _HELP[name]))
+            lines.append("# TYPE %s counter" % metric)
+            lines.append("%s %d" % (metric, self.counters[name]))
+
+        metric = "%s_validation_failures_total" % prefix
+        lines.append("# HELP %s %s" % (metric, _HELP['validation_failures']))
+        lines.append("# TYPE %s counter" % metric)
+        for reason in sorted(self.validation_failures):
+            lines.append('%s{reason="%s"} %d' % (metric, reason, self.validation_failures[reason]))
+
+        metric = "%s_phase_seconds" % prefix
+        lines.append("# HELP %s %s" % (metric, _HELP['phase_seconds']))
+        lines.append("# TYPE %s histogram" % metric)
+        for name in PHASES:
+            h = self.phases[name]
+            for bound, n in h.cumulative():
+                lines.append('%s_bucket{phase="%s",le="%s"} %d' % (metric, name, _bound(bound), n))
+            lines.append('%s_sum{phase="%s"} %r' % (metric, name, h.sum))
+            lines.append('%s_count{phase="%s"} %d' % (metric, name, h.count))
+        return "\n".join(lines) + "\n"
+
+
+def _bound(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
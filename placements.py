@@ -0,0 +1,209 @@
+import random
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed by sample_fleets()
+    np = None
+
+MASK_CELL_LIMIT = 4096  # boards with more cells than this do not precompute placement masks
+INDEX_CACHE_SIZE = 256  # number of PlacementIndex objects kept by placement_index()
+
+
+class PlacementIndex(object):
+    """
+    Every legal placement of a width x height rectangle on a board_x by board_y board. Placement k has its top left-most
+        cell at coordinate(k), placements being numbered row by row. On boards of up to MASK_CELL_LIMIT cells, masks[k]
+        is placement k as an integer bitmask whose bit y * board_x + x is set for every cell (x, y) the ship covers, so
+        overlap tests between placements are a single &.
+    """
+    def __init__(self, board_x, board_y, width, height):
+        self.board_x = board_x
+        self.board_y = board_y
+        self.width = width
+        self.height = height
+        self.nx = max(board_x - width + 1, 0)  # number of legal x-coords of the top left-most cell
+        self.ny = max(board_y - height + 1, 0)  # number of legal y-coords of the top left-most cell
+
+        row = (1 << width) - 1
+        self.template = 0  # mask of the placement at (0, 0)
+        for j in range(height):
+            self.template |= row << (j * board_x)
+
+        self.masks = None
+        if board_x * board_y <= MASK_CELL_LIMIT:
+            self.masks = tuple(self.mask(k) for k in range(len(self)))
+
+    def __len__(self):
+        return self.nx * self.ny
+
+    def coordinate(self, k):
+        """
+        :return: (x, y) tuple of the TOP LEFT-MOST cell of placement k
+        """
+        return k % self.nx, k // self.nx
+
+    def mask(self, k):
+        """
+        :return: integer bitmask of the cells covered by placement k
+        """
+        x, y = self.coordinate(k)
+        return self.template << (y * self.board_x + x)
+
+
+@lru_cache(maxsize=INDEX_CACHE_SIZE)
+def _placement_index(board_x, board_y, width, height):
+    return PlacementIndex(board_x, board_y, width, height)
+
+
+def placement_index(board_size, dimension, orientation):
+    """
+    Shared, least recently used cache of PlacementIndex objects
+    :param board_size: (board_x, board_y) tuple
+    :param dimension: (m, n) dimensions of the ship, in any order
+    :param orientation: 'vertical' (longest dimension along the y-axis) or 'horizontal' (along the x-axis)
+    :return: the PlacementIndex of the ship in that orientation
+    """
+    longer_d = max(dimension)
+    shorter_d = min(dimension)
+    if orientation == 'vertical':
+        return _placement_index(board_size[0], board_size[1], shorter_d, longer_d)
+    elif orientation == 'horizontal':
+        return _placement_index(board_size[0], board_size[1], longer_d, shorter_d)
+    raise ValueError("Orientation must be vertical or horizontal. You entered: %s" % orientation)
+
+
+def _ship_options(ships, board_size):
+    """
+    Helper that lists the (orientation, PlacementIndex) options of every ship. Square ships only get the horizontal
+        option so that every distinct layout is counted once.
+    """
+    options = list()
+    for ship_name, dimension in ships:
+        if dimension[0] == dimension[1]:
+            ship_options = [('horizontal', placement_index(board_size, dimension, 'horizontal'))]
+        else:
+            ship_options = [(o, placement_index(board_size, dimension, o)) for o in ('vertical', 'horizontal')]
+        ship_options = [(o, index) for o, index in ship_options if len(index) > 0]
+        if not ship_options:
+            raise ValueError("%s of dimensions %s does not fit on a board of size %s"
+                             % (ship_name, str(dimension), str(board_size)))
+        options.append(ship_options)
+    return options
+
+
+def _pick(ship_options, rng):
+    """
+    Draw one placement uniformly among all the placements of a ship
+    :return: (orientation, PlacementIndex, k)
+    """
+    k = rng.randrange(sum(len(index) for _, index in ship_options))
+    for orientation, index in ship_options:
+        if k < len(index):
+            return orientation, index, k
+        k -= len(index)
+
+
+def sample_fleet(ships, board_size, rng=random, max_attempts=1000000):
+    """
+    Draw a fleet uniformly at random among all the non-overlapping fleets. Every ship gets a uniformly random legal
+        placement and the whole fleet is drawn again as soon as two ships overlap, which keeps the result uniform.
+    :param ships: list of (name, dimensions) pairs, e.g. Game.ships
+    :param board_size: (board_x, board_y) tuple
+    :param rng: random.Random instance (or the random module) to draw from
+    :param max_attempts: number of fleets to draw before giving up on a fleet that (almost) does not fit
+    :return: list of ((x, y), orientation) tuples, one per ship, as taken by Game.initialize_ships()
+    """
+    options = _ship_options(ships, board_size)
+    use_masks = all(index.masks is not None for ship_options in options for _, index in ship_options)
+
+    for _ in range(max_attempts):
+        occupied = 0
+        rects = list()
+        placements = list()
+        for ship_options in options:
+            orientation, index, k = _pick(ship_options, rng)
+            x, y = index.coordinate(k)
+            if use_masks:
+                mask = index.masks[k]
+                if occupied & mask:
+                    break
+                occupied |= mask
+            else:
+                w = index.width
+                h = index.height
+                if any(x < x2 + w2 and x2 < x + w and y < y2 + h2 and y2 < y + h for x2, y2, w2, h2 in rects):
+                    break
+                rects.append((x, y, w, h))
+            placements.append(((x, y), orientation))
+        else:
+            return placements
+    raise ValueError("Could not place the fleet without overlaps in %d attempts" % max_attempts)
+
+
+def sample_fleets(ships, board_size, n_fleets, seed=None, batch_size=65536, max_attempts=1000000):
+    """
+    Bulk version of sample_fleet() drawing n_fleets uniformly random fleets with NumPy. Overlaps are tested between
+        ship rectangles, so the cost does not depend on the board area.
+    :param ships: list of (name, dimensions) pairs, e.g. Game.ships
+    :param board_size: (board_x, board_y) tuple
+    :param n_fleets: number of fleets to draw
+    :param seed: seed of the numpy random Generator
+    :param batch_size: number of fleets drawn at once, bounds the memory used
+    :param max_attempts: number of times a fleet is drawn before giving up on a fleet that (almost) does not fit
+    :return: (coords, vertical) where coords is an int32 array of shape (n_fleets, len(ships), 2) holding the TOP
+        LEFT-MOST (x, y) of every ship and vertical a boolean array of shape (n_fleets, len(ships)), the format taken by
+        BatchGame.initialize_ship_arrays()
+    """
+    if np is None:
+        raise ImportError("sample_fleets() requires numpy")
+    options = _ship_options(ships, board_size)
+    generator = np.random.default_rng(seed)
+
+    coords = np.empty((n_fleets, len(ships), 2), dtype=np.int32)
+    vertical = np.empty((n_fleets, len(ships)), dtype=bool)
+
+    for start in range(0, n_fleets, batch_size):
+        stop = min(start + batch_size, n_fleets)
+        pending = np.arange(start, stop)
+        for _ in range(max_attempts):
+            if not len(pending):
+                break
+            x, y, w, h, v = _draw_batch(options, len(pending), generator)
+            ok = np.ones(len(pending), dtype=bool)
+            for s in range(len(ships)):
+                for t in range(s):
+                    ok &= ~((x[:, s] < x[:, t] + w[:, t]) & (x[:, t] < x[:, s] + w[:, s]) &
+                            (y[:, s] < y[:, t] + h[:, t]) & (y[:, t] < y[:, s] + h[:, s]))
+            done = pending[ok]
+            coords[done, :, 0] = x[ok]
+            coords[done, :, 1] = y[ok]
+            vertical[done] = v[ok]
+            pending = pending[~ok]
+        if len(pending):
+            raise ValueError("Could not place the fleet without overlaps in %d attempts" % max_attempts)
+    return coords, vertical
+
+
+def _draw_batch(options, n, generator):
+    """
+    Helper that draws one uniformly random placement per ship for n fleets, overlaps allowed
+    :return: (x, y, w, h, vertical) arrays of shape (n, len(options))
+    """
+    shape = (n, len(options))
+    x = np.empty(shape, dtype=np.int64)
+    y = np.empty(shape, dtype=np.int64)
+    w = np.empty(shape, dtype=np.int64)
+    h = np.empty(shape, dtype=np.int64)
+    v = np.empty(shape, dtype=bool)
+    for s, ship_options in enumerate(options):
+        k = generator.integers(0, sum(len(index) for _, index in ship_options), size=n)
+        for orientation, index in ship_options:
+            chosen = (k >= 0) & (k < len(index))
+            x[chosen, s] = k[chosen] % index.nx
+            y[chosen, s] = k[chosen] // index.nx
+            w[chosen, s] = index.width
+            h[chosen, s] = index.height
+            v[chosen, s] = orientation == 'vertical'
+            k = k - len(index)
+    return x, y, w, h, v
@@ -1,12 +1,20 @@
-from game import DEFAULT, MISS, HIT, SUNK, OCCUPIED
+from constants import DEFAULT, MISS, HIT, SUNK, OCCUPIED
+from board import Board, FleetBoard
+from sparse_board import SparseBoard, SparseFleetBoard
+from events import ShotResult
 from ship import *
+from time import perf_counter
+from snapshot import PLAYER_MAGIC, SnapshotReader, SnapshotWriter
 
 
 class Player(object):
-    def __init__(self, player_name, board_dimension):
+    def __init__(self, player_name, board_dimension, sparse=False):
         self.name = player_name  # player name
-        self.my_board = dict()  # keep track of the state of my fleet and missed shots on my territory
-        self.tracking_board = dict()  # keep track of my shots on enemy territory
+        # sparse boards are for very large boards: memory grows with the ships and shots instead of the board area
+        fleet_board, board = (SparseFleetBoard, SparseBoard) if sparse else (FleetBoard, Board)
+        self.my_board = fleet_board(board_dimension)  # keep track of the state of my fleet and missed shots on my side
+        self.tracking_board = board(board_dimension)  # keep track of my shots on enemy territory
+        self.metrics = None  # Metrics collecting counters and latencies of every shot, see Game.set_metrics()
         self.board_x = board_dimension[0]
         self.board_y = board_dimension[1]
         self.life = 0  # life == 0 means that the player is dead
@@ -17,15 +25,107 @@ class Player(object):
     def __repr__(self):
         return self.name
 
+    def copy(self):
+        """
+        Fast copy of this player, see FleetBoard.copy() for what is shared
+        :return: Player
+        """
+        player = Player.__new__(Player)
+        player.name = self.name
+        player.my_board = self.my_board.copy()
+        player.tracking_board = self.tracking_board.copy()
+        player.board_x = self.board_x
+        player.board_y = self.board_y
+        player.life = self.life
+        player.metrics = None
+        return player
+
+    def to_bytes(self):
+        """
+        Serialize this player to the compact binary snapshot format, see snapshot.py
+        :return: bytes
+        """
+        writer = SnapshotWriter()
+        writer.header(PLAYER_MAGIC)
+        self._write(writer)
+        return writer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Rebuild a player from the output of .to_bytes()
+        :param data: bytes-like snapshot
+        :return: Player
+        """
+        reader = SnapshotReader(data)
+        reader.header(PLAYER_MAGIC)
+        player = cls._read(reader)
+        reader.end()
+        return player
+
+    def _write(self, writer):
+        writer.string(self.name)
+        writer.uint(self.board_x)
+        writer.uint(self.board_y)
+        writer.uint(1 if self.my_board.sparse else 0)
+        writer.uint(self.life)
+
+        writer.uint(len(self.my_board.ships))
+        fleet = self.my_board.fleet
+        for k in range(len(fleet)):
+            writer.string(fleet.names[k])
+            writer.uint(0 if fleet.vertical[k] else 1)
+            for value in fleet.rectangle(k):
+                writer.uint(value)
+            writer.uint(fleet.life[k])
+
+        if self.my_board.sparse:
+            # only the cells that were shot, as (index, state) pairs
+            for board in (self.my_board, self.tracking_board):
+                writer.uint(len(board.cells))
+                for i, state in board.cells.items():
+                    writer.uint(i)
+                    writer.uint(state)
+        else:
+            # both boards packed into one byte per cell, my_board in the low nibble and tracking_board in the high one
+            writer.raw(bytes(m | (t << 4) for m, t in zip(self.my_board.cells, self.tracking_board.cells)))
+
+    @classmethod
+    def _read(cls, reader):
+        name = reader.string()
+        board_x = reader.uint()
+        board_y = reader.uint()
+        sparse = reader.uint() == 1 if reader.version >= 2 else False
+        player = cls(name, (board_x, board_y), sparse)
+        player.life = reader.uint()
+
+        for _ in range(reader.uint()):
+            ship_name = reader.string()
+            orientation = 'vertical' if reader.uint() == 0 else 'horizontal'
+            coordinate = (reader.uint(), reader.uint())
+            dimension = (reader.uint(), reader.uint())
+            player.my_board.add_ship(ship_name, orientation, ship_rectangle(orientation, dimension, coordinate),
+                                     reader.uint(), OCCUPIED)
+
+        if sparse:
+            for board in (player.my_board, player.tracking_board):
+                for _ in range(reader.uint()):
+                    i = reader.uint()
+                    board.cells[i] = reader.uint()
+        else:
+            packed = reader.raw(board_x * board_y)
+            player.my_board.cells[:] = bytes(b & 0x0f for b in packed)
+            player.tracking_board.cells[:] = bytes(b >> 4 for b in packed)
+        return player
+
     def is_dead(self):
         if self.life == 0:
             return True
         return False
 
     def is_hit(self, coordinate):
-        if coordinate in self.my_board.keys():
-            if self.my_board[coordinate][1] == OCCUPIED:
-                return True
+        if self.my_board.in_bounds(coordinate) and self.my_board[coordinate] == OCCUPIED:
+            return True
         return False
 
     def _valid_shot(self, coordinate):
@@ -37,50 +137,142 @@ class Player(object):
         x, y = coordinate
 
         if x < 0 or y < 0:
-            raise ValueError("Cannot shoot at a negative coordinate %s" % str(coordinate))
+            raise self._invalid_shot('negative', "Cannot shoot at a negative coordinate %s" % str(coordinate))
         elif x > self.board_x - 1 or y > self.board_y - 1:
-            raise ValueError("Cannot shoot at a coordinate %s greater than the board size of %d by %d (zero indexed)" %
-                             (str(coordinate), self.board_x, self.board_y))
-        elif coordinate in self.tracking_board.keys():
-            raise ValueError("Shot at %s had already been fired previously by %s" % (str(coordinate), self.name))
+            raise self._invalid_shot('out_of_bounds', "Cannot shoot at a coordinate %s greater than the board size of "
+                                     "%d by %d (zero indexed)" % (str(coordinate), self.board_x, self.board_y))
+        elif self.tracking_board.cells[y * self.board_x + x] != DEFAULT:
+            raise self._invalid_shot('repeated', "Shot at %s had already been fired previously by %s"
+                                     % (str(coordinate), self.name))
+
+    def _valid_volley(self, coordinates, limit=None):
+        """
+        Check several shots of this player at once, raise exceptions if any is invalid. The ranges of all shots are
+            checked together before the repeats against the tracking board and between the shots themselves.
+        :param coordinates: sequence of (x,y) tuples
+        :param limit: largest number of shots allowed, None for no limit
+        :return: list of the cell indices of the shots
+        """
+        if limit is not None and not 0 < len(coordinates) <= limit:
+            raise self._invalid_shot('volley_size', "A volley must have between 1 and %d shots. You fired %d."
+                                     % (limit, len(coordinates)))
+        if not coordinates:
+            return list()
+        xs = [c[0] for c in coordinates]
+        ys = [c[1] for c in coordinates]
+        if min(xs) < 0 or min(ys) < 0 or max(xs) > self.board_x - 1 or max(ys) > self.board_y - 1:
+            for coordinate in coordinates:
+                self._valid_shot(coordinate)
+        board_x = self.board_x
+        indices = [y * board_x + x for x, y in zip(xs, ys)]
+        cells = self.tracking_board.cells
+        for i, coordinate in zip(indices, coordinates):
+            if cells[i] != DEFAULT:
+                raise self._invalid_shot('repeated', "Shot at %s had already been fired previously by %s"
+                                         % (str(coordinate), self.name))
+        if len(set(indices)) != len(indices):
+            seen = set()
+            for i, coordinate in zip(indices, coordinates):
+                if i in seen:
+                    raise self._invalid_shot('duplicate', "Shot at %s is fired twice by %s"
+                                             % (str(coordinate), self.name))
+                seen.add(i)
+        return indices
+
+    def _invalid_shot(self, reason, message):
+        """
+        Helper method counting a rejected shot when metrics are collected
+        :return: the ValueError to raise
+        """
+        if self.metrics is not None:
+            self.metrics.record_invalid_shot(reason)
+        return ValueError(message)
 
     def receive_damage(self, coordinate):
         """
         when hit, use this method to record the damage to the target ship and update the board the reflect being hit
         :param coordinate:
-        :return:
+        :return: id of the ship that was hit, its row in self.my_board.fleet
         """
-        self.my_board[coordinate][1] = HIT
-        self.my_board[coordinate][0].receive_shot()
+        board = self.my_board
+        board.set(coordinate[1] * board.board_x + coordinate[0], HIT)
+        ship_id = board.ship_id_at(coordinate[0], coordinate[1])
+        board.fleet.life[ship_id] -= 1
         self.life -= 1
+        return ship_id
 
-    def shoot_and_update_boards(self, enemy, coordinate):
+    def _sink(self, enemy, ship_id):
+        """
+        Helper marking the cells of a sunk ship as SUNK on both boards, row by row over the ship's rectangle
+        """
+        x, y, width, height = enemy.my_board.fleet.rectangle(ship_id)
+        self.tracking_board.fill(x, y, width, height, SUNK)
+        enemy.my_board.fill(x, y, width, height, SUNK)
+
+    def fire(self, enemy, index):
+        """
+        Shoot the enemy without validating the shot or building a ShotResult, for bulk play (see Game.take_turns())
+        :param enemy: enemy player to shoot
+        :param index: cell index (y * board_x + x) of a shot that was already validated
+        :return: MISS, HIT or SUNK, the state of the shot cell on the tracking board afterwards
+        """
+        if enemy.my_board.cells[index] == OCCUPIED:
+            self.tracking_board.set(index, HIT)
+            ship_id = enemy.receive_damage((index % self.board_x, index // self.board_x))
+            if enemy.my_board.fleet.life[ship_id] == 0:
+                self._sink(enemy, ship_id)
+                return SUNK
+            return HIT
+        enemy.my_board.set(index, MISS)
+        self.tracking_board.set(index, MISS)
+        return MISS
+
+    def shoot_and_update_boards(self, enemy, coordinate, validate=True):
         """
         Shoot the enemy at the input coordinate and update the boards appropriately for both the shooter and the
             receiver
         :param enemy: enemy player to shoot
         :param coordinate: (x, y) tuple of where to shoot
-        :return: does not return
+        :param validate: False if the shot was already validated, e.g. with the rest of its volley
+        :return: ShotResult describing the outcome of the shot
         """
-        self._valid_shot(coordinate)
-
-        if enemy.is_hit(coordinate):
-            self.tracking_board[coordinate] = HIT
-            enemy.receive_damage(coordinate)
-
-            print("%s hit %s's %s at %s" % (self.name, enemy.name, enemy.my_board[coordinate][0].name,
-                                            str(coordinate)))
-
-            if enemy.my_board[coordinate][0].is_sunk():
-                print("%s's %s is sunk" % (enemy.name, enemy.my_board[coordinate][0].name))
-                # update the boards as a ship has been sunk
-                for c in enemy.my_board[coordinate][0].coordinates:
-                    self.tracking_board[c] = SUNK
-                    enemy.my_board[c][1] = SUNK
+        metrics = self.metrics
+        if metrics is not None:
+            start = perf_counter()
+        if validate:
+            self._valid_shot(coordinate)
+        if metrics is not None:
+            validated = perf_counter()
+        x, y = coordinate
+        i = y * self.board_x + x
+        tracking = self.tracking_board
+        board = enemy.my_board
+        sink_start = None
+
+        if board.cells[i] == OCCUPIED:
+            tracking.set(i, HIT)
+            # enemy.receive_damage(coordinate), inlined on the hot path
+            board.set(i, HIT)
+            ship_id = board.ship_id_at(x, y)
+            fleet = board.fleet
+            fleet.life[ship_id] -= 1
+            enemy.life -= 1
+
+            if fleet.life[ship_id] == 0:
+                if metrics is not None:
+                    sink_start = perf_counter()
+                self._sink(enemy, ship_id)
+                result = ShotResult(self, enemy, coordinate, True, Ship.of(fleet, ship_id))
+            else:
+                result = ShotResult(self, enemy, coordinate, True)
         else:
-            print("%s's shot missed at %s" % (self.name, str(coordinate)))
-            enemy.my_board[coordinate] = [None, MISS]
-            self.tracking_board[coordinate] = MISS
+            board.set(i, MISS)
+            tracking.set(i, MISS)
+            result = ShotResult(self, enemy, coordinate, False)
+
+        if metrics is not None:
+            metrics.record_shot(result.hit, start, validated, sink_start, perf_counter())
+        return result
 
     def _check_ship_overlap(self, ship_name, orientation, dimension, coordinate):
         """
@@ -103,14 +295,16 @@ class Player(object):
             for i in range(0, longer_d):
                 for j in range(0, shorter_d):
                     if (x + j, y + i) in self.my_board:
-                        raise ValueError("%s overlaps with %s at (%d,%d)" % (ship_name, self.my_board[(x + j, y + i)][0]
-                                                                             , x + j, y + i))
+                        raise ValueError("%s overlaps with %s at (%d,%d)" % (ship_name,
+                                                                             self.my_board.ship_at((x + j, y + i)),
+                                                                             x + j, y + i))
         elif orientation == 'horizontal':
             for i in range(0, longer_d):
                 for j in range(0, shorter_d):
                     if (x + i, y + j) in self.my_board:
-                        raise ValueError("%s overlaps with %s at (%d,%d)" % (ship_name, self.my_board[(x + j, y + i)][0]
-                                                                             , x + i, y + j))
+                        raise ValueError("%s overlaps with %s at (%d,%d)" % (ship_name,
+                                                                             self.my_board.ship_at((x + i, y + j)),
+                                                                             x + i, y + j))
 
     def _valid_ship_placement(self, ship_name, orientation, dimension, coordinate):
         """
@@ -130,6 +324,8 @@ class Player(object):
         longer_d = max(d0, d1)
         shorter_d = min(d0, d1)
 
+        if x < 0 or y < 0:
+            raise ValueError("Cannot place %s at a negative coordinate (%d,%d)" % (ship_name, x, y))
         if y > self.board_y - 1:
             raise ValueError(
                 "y-coord of ship placement cannot be greater than %d. You entered %d." % (self.board_y - 1, y))
@@ -170,59 +366,24 @@ class Player(object):
         """
         self._valid_ship_placement(ship_name, orientation, dimension, coordinate)
         d0, d1 = dimension
-        x, y = coordinate
-        longer_d = max(d0, d1)
-        shorter_d = min(d0, d1)
 
-        ship = Ship(ship_name, orientation, dimension)
-
-        if orientation == 'vertical':
-            for i in range(0, longer_d):
-                for j in range(0, shorter_d):
-                    self.my_board[(x + j, y + i)] = [ship, OCCUPIED]
-                    ship.add_coordinates((x + j, y + i))
-            self.life += d0 * d1
-        elif orientation == 'horizontal':
-            for i in range(0, longer_d):
-                for j in range(0, shorter_d):
-                    self.my_board[(x + i, y + j)] = [ship, OCCUPIED]
-                    ship.add_coordinates((x + i, y + j))
-            self.life += d0 * d1
-        else:
-            raise ValueError("Orientation must be vertical or horizontal. You entered: %s" % orientation)
+        self.my_board.add_ship(ship_name, orientation, ship_rectangle(orientation, dimension, coordinate), d0 * d1,
+                               OCCUPIED)
+        self.life += d0 * d1
 
     def get_tracking_board_as_list(self):
         """
         This method uses self.tracking_board to construct a simple nested list.
         :return: a list of lists containing the current state of the tracking board
         """
-        l = list()
-        for y in range(0, self.board_y):
-            # s = '%d |' % y
-            sub_l = list()
-            for x in range(0, self.board_x):
-                try:
-                    sub_l.append(self.tracking_board[(x, y)])
-                except KeyError:
-                    sub_l.append(DEFAULT)
-            l.append(sub_l)
-        return l
+        return self.tracking_board.as_list()
 
     def get_my_ships_as_list(self):
         """
         This method uses self.my_board to construct a simple nested list.
         :return: a list of lists containing the current state of the board containing my fleet
         """
-        l = list()
-        for y in range(0, self.board_y):
-            sub_l = list()
-            for x in range(0, self.board_x):
-                try:
-                    sub_l.append(self.my_board[(x, y)][1])
-                except KeyError:
-                    sub_l.append(DEFAULT)
-            l.append(sub_l)
-        return l
+        return self.my_board.as_list()
 
     def _pretty_print(self, l):
         """
@@ -230,20 +391,9 @@ class Player(object):
         :param l: list of lists that represent board states
         :return: does not return
         """
-        x_label = '   x\t'
-        g_line = 'y  '
-        for i in range(0, self.board_x):
-            x_label += '%d\t' % i
-            g_line += '--------'
-
-        print(x_label)
-        print(g_line)
-
-        for y in range(0, self.board_y):
-            s = '%-2d |' % y
-            for x in range(0, self.board_x):
-                s += '\t%d' % l[y][x]
-            print(s)
+        lines = ['   x\t' + ''.join('%d\t' % i for i in range(0, self.board_x)), 'y  ' + '--------' * self.board_x]
+        lines.extend('%-2d |' % y + ''.join('\t%d' % state for state in l[y]) for y in range(0, self.board_y))
+        print('\n'.join(lines))
 
     def pretty_print_tracking_board(self):
         """
@@ -320,8 +470,8 @@ class Player(object):
 #     p2.pretty_print_tracking_board()
 #     p2.pretty_print_my_ships()
 #
-#     print p1.my_board[(0, 0)][0].coordinates
-#     print p1.my_board[(8, 0)][0].coordinates
+#     print p1.my_board.ship_at((0, 0)).coordinates
+#     print p1.my_board.ship_at((8, 0)).coordinates
 #
 #     print("%s's life: %d" % (p1.name, p1.life))
 #     print("%s dead: %s" % (p1.name, p1.is_dead()))
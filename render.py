@@ -0,0 +1,264 @@
+import shutil
+import sys
+
+from game import DEFAULT, MISS, HIT, SUNK, OCCUPIED
+
+GLYPHS = {DEFAULT: '.', MISS: 'o', HIT: 'X', SUNK: '#', OCCUPIED: 'S'}  # state -> character drawn for the cell
+COLORS = {DEFAULT: 37, MISS: 36, HIT: 31, SUNK: 35, OCCUPIED: 32}  # state -> ANSI foreground color (30 to 37)
+CELL_WIDTH = 2  # visible characters per cell: the glyph and a space
+
+CLEAR = b'\x1b[2J'
+HOME = b'\x1b[H'
+RESET = b'\x1b[0m'
+
+
+def _cell(state, color):
+    """
+    Helper returning the bytes drawn for a cell in a given state. Every state gives the same number of bytes, so that
+        cells sit at fixed offsets of the frame buffer.
+    """
+    text = GLYPHS.get(state, '?') + ' '
+    if color:
+        text = '\x1b[%dm' % COLORS.get(state, 37) + text
+    return text.encode('ascii')
+
+
+def _move(row, column):
+    """
+    Helper returning the ANSI sequence moving the cursor to a screen position (1-indexed)
+    """
+    return b'\x1b[%d;%dH' % (row, column)
+
+
+def game_boards(games):
+    """
+    Boards and titles to spectate games with a Renderer: the fleet boards of both players of every game, which show
+        the ships as well as every shot fired at them
+    :param games: iterable of Games
+    :return: (boards, titles) lists
+    """
+    boards = list()
+    titles = list()
+    for game in games:
+        for player in (game.player1, game.player2):
+            boards.append(player.my_board)
+            titles.append("%s's ships" % player.name)
+    return boards, titles
+
+
+class Renderer(object):
+    """
+    Draws many boards of the same size as a grid in a terminal. The frame lives in one buffer allocated up front, where
+        every cell takes the same number of bytes at a fixed offset: a full frame translates the cell states of each
+        board row straight into the buffer (bytes.translate() and strided slice assignment) and goes out in a single
+        write. Later draws only send the cells that changed since the previous one, each run of changed cells behind an
+        ANSI cursor move, so a turn costs a few bytes per board instead of a full reprint.
+    """
+
+    def __init__(self, boards, titles=None, columns=None, color=False, gap=2):
+        """
+        :param boards: list of Boards (Board or FleetBoard, sparse boards are not supported) that all have the same size
+        :param titles: list of one title per board, drawn above it (truncated to the width of the board)
+        :param columns: number of boards per line of the grid, None to fit as many as the terminal is wide
+        :param color: True to color the cells with ANSI escape sequences, see COLORS
+        :param gap: number of spaces between two boards of a line of the grid
+        """
+        if not boards:
+            raise ValueError("There are no boards to render")
+        self.board_x = boards[0].board_x
+        self.board_y = boards[0].board_y
+        for board in boards:
+            self._check_board(board)
+        if titles is not None and len(titles) != len(boards):
+            raise ValueError("There are %d titles for %d boards" % (len(titles), len(boards)))
+        if columns is None:
+            columns = (shutil.get_terminal_size().columns + gap) // (self.board_x * CELL_WIDTH + gap)
+        self.columns = max(1, min(columns, len(boards)))
+        self.color = color
+        self.gap = gap
+        self.boards = list(boards)
+        self.titles = list(titles) if titles is not None else [''] * len(boards)
+        self.previous = [None] * len(boards)  # copy of the cells of each board as last drawn, None to draw it all
+        self.dirty_titles = set()
+        self.drawn = False
+
+        cells = [_cell(state, color) for state in range(256)]
+        self.cell_size = len(cells[0])
+        # the bytes at position k of a cell, for every state, as a bytes.translate() table. Positions that are the same
+        # for every drawn state (e.g. the escape sequence around the color number) never need to be written again.
+        drawn = list(GLYPHS)
+        self.tables = [(k, bytes(c[k] for c in cells)) for k in range(self.cell_size)
+                       if len(set(cells[state][k] for state in drawn)) > 1]
+
+        self._build(cells[DEFAULT])
+        self.diff_buffer = bytearray()
+
+    def _check_board(self, board):
+        """
+        Helper method checking that a board can be drawn by this renderer
+        """
+        if board.sparse:
+            raise ValueError("Sparse boards cannot be rendered")
+        if (board.board_x, board.board_y) != (self.board_x, self.board_y):
+            raise ValueError("Every board must be %d by %d. You gave a board of %d by %d."
+                             % (self.board_x, self.board_y, board.board_x, board.board_y))
+
+    def _build(self, blank_cell):
+        """
+        Helper method allocating the frame buffer, every board drawn empty, and recording where each board starts
+        """
+        w = self.board_x
+        segment = w * self.cell_size
+        gap = b' ' * self.gap
+        end = (RESET if self.color else b'') + b'\n'
+        self.line_size = self.columns * segment + (self.columns - 1) * self.gap + len(end)
+        self.lines = 0  # lines of the grid, to put the cursor below it after a partial redraw
+        self.offsets = list()  # offset in the buffer of the first cell of each board
+        self.title_offsets = list()  # offset in the buffer of the title of each board
+        self.positions = list()  # (screen row, screen column) of the first cell of each board
+        parts = [CLEAR, HOME]
+        size = len(CLEAR) + len(HOME)
+        for first in range(0, len(self.boards), self.columns):
+            if first:
+                parts.append(b'\n')
+                size += 1
+                self.lines += 1
+            count = min(self.columns, len(self.boards) - first)
+            title_line = list()
+            for c in range(count):
+                self.title_offsets.append(size + c * (w * CELL_WIDTH + self.gap))
+                title_line.append(self._title(first + c))
+            line = gap.join(title_line) + b'\n'
+            parts.append(line)
+            size += len(line)
+            self.lines += 1
+            for c in range(count):
+                self.offsets.append(size + c * (segment + self.gap))
+                self.positions.append((self.lines + 1, 1 + c * (w * CELL_WIDTH + self.gap)))
+            row = gap.join([blank_cell * w] * count + [b' ' * segment] * (self.columns - count)) + end
+            parts.append(row * self.board_y)
+            size += len(row) * self.board_y
+            self.lines += self.board_y
+        self.buffer = bytearray(b''.join(parts))
+
+    def _title(self, k):
+        """
+        Helper method returning the title of board k, padded or truncated to the width of the board
+        """
+        width = self.board_x * CELL_WIDTH
+        return self.titles[k][:width].ljust(width).encode('ascii', 'replace')
+
+    def replace(self, k, board, title=None):
+        """
+        Draw another board in slot k of the grid, e.g. a new game in place of a finished one. The slot is drawn in full
+            on the next draw.
+        :param k: index of the slot in the list of boards
+        :param board: Board of the same size as the others
+        :param title: new title of the slot, None to keep the current one
+        """
+        self._check_board(board)
+        self.boards[k] = board
+        self.previous[k] = None
+        if title is not None:
+            self.titles[k] = title
+            offset = self.title_offsets[k]
+            self.buffer[offset:offset + self.board_x * CELL_WIDTH] = self._title(k)
+            self.dirty_titles.add(k)
+
+    def frame(self):
+        """
+        Write every board into the frame buffer
+        :return: read-only memoryview of the frame buffer, the plain text of the grid (with color escape sequences if
+            enabled) without the escape sequences clearing the screen
+        """
+        buffer = self.buffer
+        w = self.board_x
+        end = w * self.cell_size
+        step = self.cell_size
+        for k, board in enumerate(self.boards):
+            cells = board.cells
+            start = self.offsets[k]
+            for position, table in self.tables:
+                translated = cells.translate(table)
+                for y in range(self.board_y):
+                    s = start + y * self.line_size + position
+                    buffer[s:s + end - position:step] = translated[y * w:(y + 1) * w]
+            self.previous[k] = bytearray(cells)
+        self.dirty_titles.clear()
+        return memoryview(buffer)[len(CLEAR) + len(HOME):].toreadonly()
+
+    def diff(self):
+        """
+        Write the cells that changed since the previous frame or diff into the frame buffer
+        :return: bytes holding every run of changed cells behind an ANSI cursor move (b'' when nothing changed), the
+            cursor being left below the grid
+        """
+        out = self.diff_buffer
+        del out[:]
+        buffer = self.buffer
+        w = self.board_x
+        size = self.cell_size
+        for k, board in enumerate(self.boards):
+            cells = board.cells
+            previous = self.previous[k]
+            if previous is None:
+                previous = self.previous[k] = bytearray(len(cells))
+                changed_rows = range(self.board_y)
+                forced = True
+            elif cells == previous:
+                continue
+            else:
+                changed_rows = [y for y in range(self.board_y)
+                                if cells[y * w:(y + 1) * w] != previous[y * w:(y + 1) * w]]
+                forced = False
+            row, column = self.positions[k]
+            for y in changed_rows:
+                i = y * w
+                line = cells[i:i + w]
+                s = self.offsets[k] + y * self.line_size
+                for position, table in self.tables:
+                    buffer[s + position:s + w * size:size] = line.translate(table)
+                xs = range(w) if forced else [x for x in range(w) if line[x] != previous[i + x]]
+                run = 0
+                while run < len(xs):
+                    # merge consecutive changed cells behind a single cursor move
+                    last = run
+                    while last + 1 < len(xs) and xs[last + 1] == xs[last] + 1:
+                        last += 1
+                    out += _move(row + y, column + xs[run] * CELL_WIDTH)
+                    out += buffer[s + xs[run] * size:s + (xs[last] + 1) * size]
+                    run = last + 1
+                previous[i:i + w] = line
+        for k in self.dirty_titles:
+            row, column = self.positions[k]
+            offset = self.title_offsets[k]
+            out += _move(row - 1, column)
+            out += buffer[offset:offset + self.board_x * CELL_WIDTH]
+        self.dirty_titles.clear()
+        if out:
+            if self.color:
+                out += RESET
+            out += _move(self.lines + 1, 1)
+        return bytes(out)
+
+    def draw(self, out=None, full=False):
+        """
+        Draw the grid in a terminal with a single write: the whole frame the first time (or when full is True), then
+            only the cells that changed since the previous draw
+        :param out: binary stream to write to, sys.stdout.buffer by default
+        :param full: True to redraw the whole frame
+        :return: number of bytes written
+        """
+        if out is None:
+            out = sys.stdout.buffer
+        if full or not self.drawn:
+            self.frame()
+            # the screen is only cleared the first time, later full frames overwrite it from the top left corner
+            data = memoryview(self.buffer)[0 if not self.drawn else len(CLEAR):]
+            self.drawn = True
+        else:
+            data = self.diff()
+        if data:
+            out.write(data)
+            out.flush()
+        return len(data)
@@ -0,0 +1,409 @@
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import OrderedDict
+
+from game import DEFAULT_SHIPS, Game
+from metrics import Metrics
+from player import Player
+
+
+class ProtocolError(Exception):
+    """
+    A request that cannot be served. Its message is sent back to the client in an error response.
+    """
+    pass
+
+
+class Match(object):
+    """
+    One two-player game hosted by the server. All of the match's state lives in this object, so matches cannot see or
+        affect each other.
+    """
+    def __init__(self, match_id, board_size, custom_ships):
+        self.match_id = match_id
+        self.game = Game("player1", "player2", board_size)
+        for ship_name, dimensions in custom_ships:
+            self.game.add_custom_ship(ship_name, dimensions)
+        self.connections = [None, None]  # Connection of player1 and player2
+        self.placements = [None, None]  # validated placements of each player
+        self.started = False
+        self.last_active = time.monotonic()
+
+    def seat(self, connection):
+        """
+        :return: 0 if connection plays player1 in this match, 1 for player2
+        """
+        for seat in (0, 1):
+            if self.connections[seat] is connection:
+                return seat
+        raise ProtocolError("Not a player of match %d" % self.match_id)
+
+
+class Connection(object):
+    """
+    A client connection. Responses are followed by a drain of the socket, so the server stops reading the requests of
+        a client that stops reading its responses (backpressure). Events are written without waiting, and a client
+        that lets more than max_buffer bytes of them pile up is dropped.
+    """
+    def __init__(self, reader, writer, max_buffer):
+        self.reader = reader
+        self.writer = writer
+        self.max_buffer = max_buffer
+        self.matches = dict()  # match id -> Match this connection plays in
+        self.closed = False
+
+    def notify(self, message):
+        """
+        Write a message without waiting
+        :return: False if the connection is closed or has just been dropped for being too far behind
+        """
+        if self.closed:
+            return False
+        self.writer.write(json.dumps(message, separators=(',', ':')).encode('utf-8') + b'\n')
+        if self.writer.transport.get_write_buffer_size() > self.max_buffer:
+            self.close()
+            return False
+        return True
+
+    async def send(self, message):
+        """
+        Write a message and wait until the client has read enough of what was sent to it
+        """
+        if self.notify(message):
+            try:
+                await self.writer.drain()
+            except ConnectionError:
+                self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.writer.close()
+
+
+class BattleshipServer(object):
+    def __init__(self, host='127.0.0.1', port=8765, max_matches=10000, idle_timeout=300.0, max_board_cells=10000,
+                 max_ships=32, max_buffer=1 << 20, max_line=65536, metrics=None):
+        """
+        Initializer for BattleshipServer class. The server speaks line-delimited JSON over TCP, see .dispatch() for the
+            requests it understands.
+        :param host: address to listen on
+        :param port: port to listen on, 0 picks a free port (see .port once started)
+        :param max_matches: number of matches hosted at once, further 'create' requests are refused
+        :param idle_timeout: seconds without a request after which a match is evicted
+        :param max_board_cells: largest board area a match may ask for, which bounds the memory of a match
+        :param max_ships: largest fleet a match may ask for
+        :param max_buffer: bytes waiting to be sent to a client before it is considered too slow
+        :param max_line: longest request line accepted, in bytes
+        :param metrics: metrics.Metrics collecting the counters and turn latencies of every match, None to not collect
+        """
+        self.host = host
+        self.port = port
+        self.max_matches = max_matches
+        self.idle_timeout = idle_timeout
+        self.max_board_cells = max_board_cells
+        self.max_ships = max_ships
+        self.max_buffer = max_buffer
+        self.max_line = max_line
+        self.metrics = metrics
+        self.matches = OrderedDict()  # match id -> Match, least recently active first
+        self.match_ids = itertools.count(1)
+        self.server = None
+        self.evictor = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port, limit=self.max_line)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.evictor = asyncio.ensure_future(self._evict_idle())
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.evictor is not None:
+            self.evictor.cancel()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        connection = Connection(reader, writer, self.max_buffer)
+        try:
+            while not connection.closed:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    await connection.send({'ok': False, 'error': "Request longer than %d bytes" % self.max_line})
+                    break
+                except ConnectionError:
+                    break
+                if not line:
+                    break
+                await connection.send(self._respond(connection, line))
+        finally:
+            for match in list(connection.matches.values()):
+                self._end_match(match, {'event': 'abandoned', 'match': match.match_id})
+            connection.close()
+
+    def _respond(self, connection, line):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ProtocolError("A request must be a JSON object")
+            request_id = request.get('id')
+            response = self.dispatch(connection, request)
+            response['ok'] = True
+        except ProtocolError as e:
+            response = {'ok': False, 'error': str(e)}
+        except ValueError as e:  # malformed JSON and the engine's own rule violations
+            response = {'ok': False, 'error': str(e)}
+        except OverflowError:  # JSON accepts Infinity, which int() cannot convert
+            response = {'ok': False, 'error': "Numbers must be finite"}
+        if request_id is not None:
+            response['id'] = request_id
+        return response
+
+    def dispatch(self, connection, request):
+        """
+        Serve one request. Requests are JSON objects with an 'op' field and an optional 'id' echoed in the response:
+            {"op": "create", "board_size": [10, 10], "custom_ships": [["Patrol", [2, 2]]]} -> {"match": id, "player": 1}
+            {"op": "join", "match": id} -> {"match": id, "player": 2}
+            {"op": "place", "match": id, "placements": [[[x, y], "vertical"], ...]}
+            {"op": "shoot", "match": id, "coordinate": [x, y]} -> {"result": {...}}
+            {"op": "boards", "match": id} -> {"tracking": [[...]], "ships": [[...]]}
+            {"op": "leave", "match": id}
+            {"op": "metrics", "format": "dict" or "prometheus"} -> {"metrics": {...} or "..."} (if collected)
+            The opponent receives events: joined, started, shot (with the same result), abandoned and evicted.
+        :return: response dict
+        """
+        op = request.get('op')
+        if op == 'create':
+            return self._create(connection, request)
+        if op == 'metrics':
+            return self._metrics(request)
+
+        match = self._match(request)
+        self.matches.move_to_end(match.match_id)
+        match.last_active = time.monotonic()
+
+        if op == 'join':
+            return self._join(connection, match)
+        seat = match.seat(connection)
+        if op == 'place':
+            return self._place(match, seat, request)
+        elif op == 'shoot':
+            return self._shoot(match, seat, request)
+        elif op == 'boards':
+            player = match.game.player1 if seat == 0 else match.game.player2
+            return {'match': match.match_id, 'tracking': player.get_tracking_board_as_list(),
+                    'ships': player.get_my_ships_as_list()}
+        elif op == 'leave':
+            self._end_match(match, {'event': 'abandoned', 'match': match.match_id}, skip=connection)
+            return {'match': match.match_id}
+        raise ProtocolError("Unknown op %r" % op)
+
+    def _metrics(self, request):
+        if self.metrics is None:
+            raise ProtocolError("This server does not collect metrics")
+        if request.get('format', 'dict') == 'prometheus':
+            return {'metrics': self.metrics.to_prometheus()}
+        return {'metrics': self.metrics.snapshot()}
+
+    def _match(self, request):
+        try:
+            return self.matches[request['match']]
+        except (KeyError, TypeError):
+            raise ProtocolError("No such match %r" % request.get('match'))
+
+    def _create(self, connection, request):
+        if len(self.matches) >= self.max_matches:
+            raise ProtocolError("Server is full")
+        try:
+            board_size = tuple(int(d) for d in request.get('board_size', (10, 10)))
+            custom_ships = [(str(name), (int(d[0]), int(d[1]))) for name, d in request.get('custom_ships', ())]
+        except (TypeError, ValueError, OverflowError, IndexError):
+            raise ProtocolError("Malformed board_size or custom_ships")
+        if len(board_size) != 2 or min(board_size) < 1 or board_size[0] * board_size[1] > self.max_board_cells:
+            raise ProtocolError("Board size must be positive and at most %d cells" % self.max_board_cells)
+        if len(DEFAULT_SHIPS) + len(custom_ships) > self.max_ships:
+            raise ProtocolError("A fleet can have at most %d ships" % self.max_ships)
+        for ship_name, dimensions in custom_ships:
+            if min(dimensions) < 1:
+                raise ProtocolError("Ship %s must have positive dimensions" % ship_name)
+            if min(dimensions) > min(board_size) or max(dimensions) > max(board_size):
+                raise ProtocolError("Ship %s does not fit on the board" % ship_name)
+
+        match = Match(next(self.match_ids), board_size, custom_ships)
+        if self.metrics is not None:
+            match.game.set_metrics(self.metrics)
+        match.connections[0] = connection
+        connection.matches[match.match_id] = match
+        self.matches[match.match_id] = match
+        return {'match': match.match_id, 'player': 1, 'ships': match.game.ships}
+
+    def _join(self, connection, match):
+        if match.connections[1] is not None:
+            raise ProtocolError("Match %d is full" % match.match_id)
+        if match.connections[0] is connection:
+            raise ProtocolError("Cannot join your own match %d" % match.match_id)
+        match.connections[1] = connection
+        connection.matches[match.match_id] = match
+        match.connections[0].notify({'event': 'joined', 'match': match.match_id})
+        return {'match': match.match_id, 'player': 2, 'ships': match.game.ships}
+
+    def _place(self, match, seat, request):
+        if match.started:
+            raise ProtocolError("Match %d has already started" % match.match_id)
+        if match.placements[seat] is not None:
+            raise ProtocolError("Ships are already placed")
+        try:
+            placements = [((int(c[0]), int(c[1])), str(o)) for c, o in request['placements']]
+        except (KeyError, TypeError, ValueError, OverflowError, IndexError):
+            raise ProtocolError("Malformed placements")
+        if len(placements) != len(match.game.ships):
+            raise ProtocolError("Expected %d placements" % len(match.game.ships))
+        # validate against a scratch player so that a bad fleet is refused without touching the match
+        scratch = Player("placement", (match.game.board_x, match.game.board_y))
+        for (ship_name, dimension), (coordinate, orientation) in zip(match.game.ships, placements):
+            scratch.place_ship(ship_name, orientation, dimension, coordinate)
+        match.placements[seat] = placements
+
+        if match.placements[0] is not None and match.placements[1] is not None:
+            match.game.initialize_ships(match.placements[0], match.placements[1])
+            match.started = True
+            for c in match.connections:
+                c.notify({'event': 'started', 'match': match.match_id, 'turn': 0})
+        return {'match': match.match_id}
+
+    def _shoot(self, match, seat, request):
+        game = match.game
+        if not match.started:
+            raise ProtocolError("Match %d has not started" % match.match_id)
+        if game.is_game_over():
+            raise ProtocolError("Match %d is over" % match.match_id)
+        if game.turn % 2 != seat:
+            raise ProtocolError("Not your turn")
+        try:
+            coordinate = (int(request['coordinate'][0]), int(request['coordinate'][1]))
+        except (KeyError, TypeError, ValueError, OverflowError, IndexError):
+            raise ProtocolError("Malformed coordinate")
+
+        # take_turn() does no I/O and runs in microseconds, so it is run inline on the event loop
+        result = game.take_turn(coordinate)
+        summary = {'turn': result.turn, 'coordinate': list(coordinate), 'hit': result.hit,
+                   'sunk': result.sunk.name if result.sunk is not None else None,
+                   'winner': None if result.winner is None else (1 if result.winner is game.player1 else 2)}
+        opponent = match.connections[1 - seat]
+        if opponent is not None:
+            opponent.notify({'event': 'shot', 'match': match.match_id, 'result': summary})
+        if game.is_game_over():
+            self._end_match(match, None)
+        return {'match': match.match_id, 'result': summary}
+
+    def _end_match(self, match, event, skip=None):
+        """
+        Forget a match, telling its players (except skip) about it with event
+        """
+        self.matches.pop(match.match_id, None)
+        for c in match.connections:
+            if c is None:
+                continue
+            c.matches.pop(match.match_id, None)
+            if event is not None and c is not skip:
+                c.notify(event)
+
+    async def _evict_idle(self):
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 4.0, 0.01))
+            deadline = time.monotonic() - self.idle_timeout
+            # matches are kept in order of last activity, so only the evicted ones are looked at
+            while self.matches:
+                match = next(iter(self.matches.values()))
+                if match.last_active > deadline:
+                    break
+                self._end_match(match, {'event': 'evicted', 'match': match.match_id})
+
+
+class BattleshipClient(object):
+    """
+    Minimal asyncio client of BattleshipServer, used by the load generator and as a stand-in for real clients
+    """
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.pending = dict()  # request id -> Future of its response
+        self.events = dict()  # match id -> Queue of events
+        self.request_ids = itertools.count(1)
+        self.listener = None
+
+    async def connect(self, host, port):
+        self.reader, self.writer = await asyncio.open_connection(host, port, limit=1 << 20)
+        self.listener = asyncio.ensure_future(self._listen())
+
+    async def _listen(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if 'event' in message:
+                    self.event_queue(message['match']).put_nowait(message)
+                else:
+                    future = self.pending.pop(message.get('id'), None)
+                    if future is not None and not future.done():
+                        future.set_result(message)
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connection closed"))
+
+    def event_queue(self, match_id):
+        if match_id not in self.events:
+            self.events[match_id] = asyncio.Queue()
+        return self.events[match_id]
+
+    async def request(self, op, **fields):
+        """
+        Send a request and wait for its response
+        :return: response dict. ProtocolError is raised for error responses.
+        """
+        fields['op'] = op
+        fields['id'] = request_id = next(self.request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.writer.write(json.dumps(fields, separators=(',', ':')).encode('utf-8') + b'\n')
+        await self.writer.drain()
+        response = await future
+        if not response['ok']:
+            raise ProtocolError(response['error'])
+        return response
+
+    async def next_event(self, match_id):
+        return await self.event_queue(match_id).get()
+
+    async def close(self):
+        self.writer.close()
+        if self.listener is not None:
+            await self.listener
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host battleship matches over line-delimited JSON")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-matches', type=int, default=10000)
+    parser.add_argument('--idle-timeout', type=float, default=300.0)
+    parser.add_argument('--metrics', action='store_true', help="collect metrics, served by the 'metrics' request")
+    args = parser.parse_args()
+
+    server = BattleshipServer(args.host, args.port, args.max_matches, args.idle_timeout,
+                              metrics=Metrics() if args.metrics else None)
+    asyncio.run(server.serve_forever())
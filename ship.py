@@ -1,24 +1,195 @@
+from array import array
+
+
+def ship_rectangle(orientation, dimension, coordinate):
+    """
+    :param orientation: 'vertical' (longest dimension along the y-axis) or 'horizontal' (along the x-axis)
+    :param dimension: (m, n) dimensions of the ship, in any order
+    :param coordinate: (x, y) of the TOP LEFT-MOST cell of the ship
+    :return: (x, y, width, height) of the cells covered by the ship
+    """
+    longer_d = max(dimension)
+    shorter_d = min(dimension)
+    if orientation == 'vertical':
+        return coordinate[0], coordinate[1], shorter_d, longer_d
+    return coordinate[0], coordinate[1], longer_d, shorter_d
+
+
+class FleetTable(object):
+    """
+    Struct-of-arrays storage for the ships of one fleet. Ship k is row k of every column: its name, whether it is
+        vertical (1) or horizontal (0), the TOP LEFT-MOST cell (x, y) and size (width along the x-axis, height along the
+        y-axis) of the rectangle it covers, and its remaining life. Only life changes once the fleet is
+        placed, so copies share every other column until one of them adds a ship.
+    """
+    __slots__ = ('names', 'vertical', 'x', 'y', 'width', 'height', 'life', 'shared')
+
+    def __init__(self):
+        self.names = list()
+        self.vertical = bytearray()
+        self.x = array('i')
+        self.y = array('i')
+        self.width = array('i')
+        self.height = array('i')
+        self.life = array('i')
+        self.shared = False  # True when the static columns are shared with a copy and must be copied on write
+
+    def __len__(self):
+        return len(self.names)
+
+    def copy(self):
+        """
+        :return: copy of this table with its own life column
+        """
+        table = FleetTable.__new__(FleetTable)
+        table.names = self.names
+        table.vertical = self.vertical
+        table.x = self.x
+        table.y = self.y
+        table.width = self.width
+        table.height = self.height
+        table.life = array('i', self.life)
+        table.shared = self.shared = True
+        return table
+
+    def add(self, name, orientation, rectangle, life):
+        """
+        :param name: name of the ship
+        :param orientation: 'vertical' or 'horizontal'
+        :param rectangle: (x, y, width, height) of the cells covered by the ship, (x, y) being the TOP LEFT-MOST one
+        :param life: remaining life of the ship
+        :return: id of the ship, its row in the table
+        """
+        if self.shared:
+            self.names = list(self.names)
+            self.vertical = bytearray(self.vertical)
+            self.x = array('i', self.x)
+            self.y = array('i', self.y)
+            self.width = array('i', self.width)
+            self.height = array('i', self.height)
+            self.shared = False
+        self.names.append(name)
+        self.vertical.append(1 if orientation == 'vertical' else 0)
+        self.x.append(rectangle[0])
+        self.y.append(rectangle[1])
+        self.width.append(rectangle[2])
+        self.height.append(rectangle[3])
+        self.life.append(life)
+        return len(self.names) - 1
+
+    def rectangle(self, ship_id):
+        """
+        :return: (x, y, width, height) of the cells covered by ship ship_id
+        """
+        return self.x[ship_id], self.y[ship_id], self.width[ship_id], self.height[ship_id]
+
+
 class Ship(object):
+    """
+    Facade over one row of a FleetTable, e.g. the ship returned by FleetBoard.ship_at(). Facades are made on demand
+        and hold no state of their own, so a Ship created directly lives in a one-row table of its own.
+    """
+    __slots__ = ('table', 'ship_id')
+
     def __str__(self):
         return self.name
 
     def __repr__(self):
         return self.name
 
-    def __init__(self, name, orientation, dimension):
+    def __eq__(self, other):
+        # facades are created on demand, two of them are the same ship if they share their row
+        return isinstance(other, Ship) and self.table is other.table and self.ship_id == other.ship_id
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.table), self.ship_id))
+
+    def __init__(self, name, orientation, dimension, coordinate=None):
+        """
+        :param name: name of this ship
+        :param orientation: 'vertical' (longest dimension along the y-axis) or 'horizontal' (along the x-axis)
+        :param dimension: (m, n) dimensions of the ship, in any order
+        :param coordinate: (x, y) of the TOP LEFT-MOST cell of the ship, None until the ship is placed
+        """
         d0, d1 = dimension
-        self.name = name  # name of this ship
-        self.orientation = orientation  # 'vertical' or 'horizontal'
-        self.life = d0 * d1  # when life == 0, the ship is sunk
-        self.coordinates = list()  # coordinates of where this ship lives on the board
+        self.table = FleetTable()
+        self.ship_id = self.table.add(name, orientation, ship_rectangle(orientation, dimension, coordinate or (-1, -1)),
+                                      d0 * d1)
+
+    @classmethod
+    def of(cls, table, ship_id):
+        """
+        :return: Ship facade over row ship_id of table
+        """
+        ship = cls.__new__(cls)
+        ship.table = table
+        ship.ship_id = ship_id
+        return ship
+
+    def copy(self):
+        """
+        Copy of this ship, in a table of its own
+        """
+        table = self.table
+        k = self.ship_id
+        ship = Ship.of(FleetTable(), 0)
+        ship.table.add(table.names[k], self.orientation, table.rectangle(k), table.life[k])
+        return ship
+
+    @property
+    def name(self):
+        return self.table.names[self.ship_id]
+
+    @property
+    def orientation(self):
+        return 'vertical' if self.table.vertical[self.ship_id] else 'horizontal'
+
+    @property
+    def life(self):
+        # when life == 0, the ship is sunk
+        return self.table.life[self.ship_id]
+
+    @life.setter
+    def life(self, value):
+        self.table.life[self.ship_id] = value
+
+    @property
+    def rectangle(self):
+        """
+        (x, y, width, height) of the cells covered by the ship, (x, y) being the TOP LEFT-MOST one
+        """
+        return self.table.rectangle(self.ship_id)
+
+    @property
+    def coordinates(self):
+        """
+        List of the (x, y) cells covered by the ship, in the order Player.place_ship() lists them. Built on every call
+            from the ship's rectangle: prefer .rectangle where it will do.
+        """
+        x, y, width, height = self.rectangle
+        if x < 0:
+            return list()
+        if self.table.vertical[self.ship_id]:
+            return [(x + i, y + j) for j in range(height) for i in range(width)]
+        return [(x + i, y + j) for i in range(width) for j in range(height)]
 
     def add_coordinates(self, coord):
-        self.coordinates.append(coord)
+        """
+        Record a cell covered by a ship that was created without its coordinate, moving its origin to the TOP LEFT-MOST
+            cell recorded so far
+        """
+        table = self.table
+        k = self.ship_id
+        table.x[k] = coord[0] if table.x[k] < 0 else min(table.x[k], coord[0])
+        table.y[k] = coord[1] if table.y[k] < 0 else min(table.y[k], coord[1])
 
     def receive_shot(self):
-        self.life -= 1
+        self.table.life[self.ship_id] -= 1
 
     def is_sunk(self):
-        if self.life == 0:
+        if self.table.life[self.ship_id] == 0:
             return True
         return False
@@ -0,0 +1,81 @@
+SNAPSHOT_VERSION = 3  # bump whenever the layout written by Game.to_bytes() / Player.to_bytes() changes
+SUPPORTED_VERSIONS = (1, 2, 3)  # version 1 has no board mode and is always dense, versions before 3 have no salvo
+GAME_MAGIC = b'BSG'
+PLAYER_MAGIC = b'BSP'
+
+
+class SnapshotWriter(object):
+    """
+    Append-only buffer for the binary snapshot format. Integers are unsigned LEB128 varints, so the small numbers that
+        make up most of a game take a single byte.
+    """
+    def __init__(self):
+        self.buf = bytearray()
+
+    def header(self, magic):
+        self.buf += magic
+        self.uint(SNAPSHOT_VERSION)
+
+    def uint(self, n):
+        if n < 0:
+            raise ValueError("Cannot write a negative number %d to a snapshot" % n)
+        while n > 0x7f:
+            self.buf.append((n & 0x7f) | 0x80)
+            n >>= 7
+        self.buf.append(n)
+
+    def raw(self, data):
+        self.buf += data
+
+    def string(self, s):
+        data = s.encode('utf-8')
+        self.uint(len(data))
+        self.buf += data
+
+    def getvalue(self):
+        return bytes(self.buf)
+
+
+class SnapshotReader(object):
+    """
+    Reads back what a SnapshotWriter wrote. Truncated or foreign data raises ValueError.
+    """
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.pos = 0
+        self.version = SNAPSHOT_VERSION  # version of the snapshot being read, known once the header is read
+
+    def header(self, magic):
+        if bytes(self.raw(len(magic))) != magic:
+            raise ValueError("Not a %s snapshot" % magic.decode('ascii'))
+        self.version = self.uint()
+        if self.version not in SUPPORTED_VERSIONS:
+            raise ValueError("Unsupported snapshot version %d, expected one of %s"
+                             % (self.version, str(SUPPORTED_VERSIONS)))
+
+    def uint(self):
+        n = 0
+        shift = 0
+        while True:
+            if self.pos >= len(self.data):
+                raise ValueError("Snapshot is truncated")
+            b = self.data[self.pos]
+            self.pos += 1
+            n |= (b & 0x7f) << shift
+            if b < 0x80:
+                return n
+            shift += 7
+
+    def raw(self, n):
+        if self.pos + n > len(self.data):
+            raise ValueError("Snapshot is truncated")
+        chunk = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return chunk
+
+    def string(self):
+        return bytes(self.raw(self.uint())).decode('utf-8')
+
+    def end(self):
+        if self.pos != len(self.data):
+            raise ValueError("Snapshot has %d trailing bytes" % (len(self.data) - self.pos))
@@ -0,0 +1,174 @@
+from constants import DEFAULT, OCCUPIED
+from board import Board, FleetBoard
+from ship import FleetTable, Ship
+
+BUCKET_SIZE = 16  # side of the square buckets of the ship index, a little larger than the usual ship
+
+
+class SparseCells(dict):
+    """
+    Cell index -> state of the cells that were written to. Reading any other cell gives DEFAULT without storing it, so
+        code indexing Board.cells works unchanged.
+    """
+    def __missing__(self, index):
+        return DEFAULT
+
+
+class SparseFleetCells(dict):
+    """
+    Cell index -> state of the cells of a fleet board that were shot. Other cells are OCCUPIED if a ship covers them and
+        DEFAULT otherwise, as told by the board's ship index.
+    """
+    def __init__(self, board):
+        dict.__init__(self)
+        self.board = board
+
+    def __missing__(self, index):
+        if self.board.ship_id_at(index % self.board.board_x, index // self.board.board_x) < 0:
+            return DEFAULT
+        return OCCUPIED
+
+
+class ShipIndex(object):
+    """
+    Spatial index of ship rectangles: the board is cut into BUCKET_SIZE x BUCKET_SIZE buckets and each ship is listed in
+        the few buckets its rectangle touches. Memory grows with the number of ships, not with the board area.
+    """
+    def __init__(self):
+        self.rects = list()  # ship id -> (x, y, width, height)
+        self.buckets = dict()  # (bucket x, bucket y) -> list of ship ids
+
+    def copy(self):
+        index = ShipIndex()
+        index.rects = list(self.rects)
+        index.buckets = dict((k, list(v)) for k, v in self.buckets.items())
+        return index
+
+    def add(self, rect):
+        """
+        :param rect: (x, y, width, height) of the ship
+        :return: id of the ship in the index
+        """
+        ship_id = len(self.rects)
+        self.rects.append(rect)
+        x, y, w, h = rect
+        for bx in range(x // BUCKET_SIZE, (x + w - 1) // BUCKET_SIZE + 1):
+            for by in range(y // BUCKET_SIZE, (y + h - 1) // BUCKET_SIZE + 1):
+                self.buckets.setdefault((bx, by), []).append(ship_id)
+        return ship_id
+
+    def find(self, x, y):
+        """
+        :return: id of the ship covering (x, y), -1 if there is none
+        """
+        for ship_id in self.buckets.get((x // BUCKET_SIZE, y // BUCKET_SIZE), ()):
+            sx, sy, w, h = self.rects[ship_id]
+            if sx <= x < sx + w and sy <= y < sy + h:
+                return ship_id
+        return -1
+
+
+class SparseBoard(Board):
+    """
+    Board for very large boards that only stores the cells that were written to. It supports everything Board does
+        except the views that need one byte per cell (rows(), as_memoryview(), as_array()). as_list() works but walks
+        the whole area.
+    """
+    sparse = True
+
+    def __init__(self, board_dimension):
+        self.board_x = board_dimension[0]
+        self.board_y = board_dimension[1]
+        self.cells = SparseCells()
+
+    def copy(self):
+        board = SparseBoard.__new__(SparseBoard)
+        board.board_x = self.board_x
+        board.board_y = self.board_y
+        board.cells = SparseCells(self.cells)
+        return board
+
+    def set(self, index, state):
+        self.cells[index] = state
+
+    def restore(self, index, state):
+        # cells that were never written to read as their initial state, forgetting the cell restores it
+        self.cells.pop(index, None)
+
+    def fill(self, x, y, width, height, state):
+        cells = self.cells
+        for j in range(y, y + height):
+            start = j * self.board_x + x
+            for i in range(start, start + width):
+                cells[i] = state
+
+    def items(self):
+        """
+        :return: iterator of ((x, y), state) pairs of the cells that were written to
+        """
+        w = self.board_x
+        return (((i % w, i // w), state) for i, state in self.cells.items())
+
+    def values(self):
+        return self.cells.values()
+
+    def as_list(self):
+        cells = self.cells
+        w = self.board_x
+        return [[cells[y * w + x] for x in range(w)] for y in range(self.board_y)]
+
+    def rows(self):
+        raise ValueError("Cached row views are not available on sparse boards, use .items()")
+
+    def as_memoryview(self):
+        raise ValueError("Sparse boards cannot be viewed as a memoryview, use .items()")
+
+    def as_array(self):
+        raise ValueError("Sparse boards cannot be viewed as an array, use .items()")
+
+
+class SparseFleetBoard(SparseBoard, FleetBoard):
+    """
+    Sparse board holding a player's own fleet. Ships are kept as rectangles in a ShipIndex instead of per-cell entries,
+        and only the cells that were shot are stored.
+    """
+    def __init__(self, board_dimension):
+        SparseBoard.__init__(self, board_dimension)
+        self.cells = SparseFleetCells(self)
+        self.fleet = FleetTable()  # ships in the order they were placed
+        self.ship_index = ShipIndex()
+        self.ids_shared = False  # True when ship_index is shared with a copy of this board and must be copied on write
+
+    def copy(self):
+        board = SparseFleetBoard.__new__(SparseFleetBoard)
+        board.board_x = self.board_x
+        board.board_y = self.board_y
+        board.cells = SparseFleetCells(board)
+        board.cells.update(self.cells)
+        board.fleet = self.fleet.copy()
+        board.ship_index = self.ship_index
+        board.ids_shared = self.ids_shared = True
+        return board
+
+    def add_ship(self, ship_name, orientation, rectangle, life, state):
+        """
+        Register a ship on the board. Its cells are not stored: they read as OCCUPIED through the ship index.
+        :param state: initial state of the ship's cells, only OCCUPIED is supported
+        :return: id of the ship on this board
+        """
+        if state != OCCUPIED:
+            raise ValueError("Ships can only be added to a sparse board as OCCUPIED")
+        if self.ids_shared:
+            self.ship_index = self.ship_index.copy()
+            self.ids_shared = False
+        self.ship_index.add(rectangle)
+        return self.fleet.add(ship_name, orientation, rectangle, life)
+
+    def ship_id_at(self, x, y):
+        return self.ship_index.find(x, y)
+
+    def ship_at(self, coordinate):
+        ship_id = self.ship_index.find(coordinate[0], coordinate[1])
+        if ship_id < 0:
+            return None
+        return Ship.of(self.fleet, ship_id)
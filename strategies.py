@@ -0,0 +1,122 @@
+from game import DEFAULT, HIT
+from placements import sample_fleet
+
+
+class Shooter(object):
+    """
+    Base class of targeting strategies. A shooter is started once per game and is then asked for a shot on each of its
+        turns. Shooters are pickled to worker processes by the tournament runner, so their state must be picklable.
+    """
+    def start(self, game, player, rng):
+        """
+        Reset the strategy for a new game
+        :param game: the Game being played
+        :param player: the Player this strategy shoots for. player.tracking_board holds the shots fired so far.
+        :param rng: random.Random instance to draw from, so that matches can be replayed from a seed
+        :return: does not return
+        """
+        self.game = game
+        self.player = player
+        self.rng = rng
+
+    def choose_shot(self):
+        """
+        :return: (x, y) tuple of the next cell to shoot. Must not have been shot before.
+        """
+        raise NotImplementedError
+
+    def observe(self, result):
+        """
+        Called with the ShotResult of every shot this strategy fired
+        :param result: ShotResult returned by Game.take_turn()
+        :return: does not return
+        """
+        pass
+
+
+class RandomShooter(Shooter):
+    """
+    Shoots every cell of the board once in a random order. On sparse boards, which are too large to list every cell,
+        it draws random cells until it finds one that was not shot yet.
+    """
+    def start(self, game, player, rng):
+        Shooter.start(self, game, player, rng)
+        self.order = None
+        if not player.tracking_board.sparse:
+            self.order = [(x, y) for y in range(game.board_y) for x in range(game.board_x)]
+            rng.shuffle(self.order)
+
+    def choose_shot(self):
+        tracking = self.player.tracking_board
+        if self.order is None:
+            while True:
+                coordinate = (self.rng.randrange(self.game.board_x), self.rng.randrange(self.game.board_y))
+                if tracking[coordinate] == DEFAULT:
+                    return coordinate
+        while True:
+            coordinate = self.order.pop()
+            if tracking[coordinate] == DEFAULT:
+                return coordinate
+
+
+class HuntTargetShooter(Shooter):
+    """
+    Hunts on a checkerboard pattern in random order and, after a hit, targets the neighbours of the hit cells until
+        the ship is sunk
+    """
+    def start(self, game, player, rng):
+        Shooter.start(self, game, player, rng)
+        even = [(x, y) for y in range(game.board_y) for x in range(game.board_x) if (x + y) % 2 == 0]
+        odd = [(x, y) for y in range(game.board_y) for x in range(game.board_x) if (x + y) % 2 == 1]
+        rng.shuffle(even)
+        rng.shuffle(odd)
+        # popped from the end, so the checkerboard cells come first and the rest is only needed for 1x1 ships
+        self.hunt = odd + even
+        self.targets = list()
+
+    def choose_shot(self):
+        tracking = self.player.tracking_board
+        while self.targets:
+            coordinate = self.targets.pop()
+            if tracking[coordinate] == DEFAULT:
+                return coordinate
+        while True:
+            coordinate = self.hunt.pop()
+            if tracking[coordinate] == DEFAULT:
+                return coordinate
+
+    def observe(self, result):
+        if not result.hit:
+            return
+        if result.sunk is not None:
+            # drop the targets that only made sense while hunting down this ship if no other hit is left unexplained
+            if HIT not in self.player.tracking_board.values():
+                self.targets = list()
+            return
+        x, y = result.coordinate
+        tracking = self.player.tracking_board
+        for c in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            if tracking.in_bounds(c) and tracking[c] == DEFAULT:
+                self.targets.append(c)
+
+
+class Placement(object):
+    """
+    Base class of fleet placement strategies
+    """
+    def place(self, ships, board_size, rng):
+        """
+        :param ships: list of (name, dimensions) pairs, e.g. Game.ships
+        :param board_size: (board_x, board_y) tuple
+        :param rng: random.Random instance to draw from
+        :return: list of ((x, y), orientation) tuples, one per ship, as taken by Game.initialize_ships()
+        """
+        raise NotImplementedError
+
+
+class RandomPlacement(Placement):
+    """
+    Draws a fleet uniformly at random among all the non-overlapping fleets, see placements.sample_fleet()
+    """
+    def place(self, ships, board_size, rng):
+        return sample_fleet(ships, board_size, rng)
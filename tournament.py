@@ -0,0 +1,282 @@
+import hashlib
+import os
+import random
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from game import Game
+
+
+def derive_seed(*parts):
+    """
+    Derive a 64-bit seed from any number of values. Unlike hash(), the result does not change between processes or
+        interpreter runs, which is what makes matches reproducible whichever worker plays them.
+    """
+    key = "/".join(str(p) for p in parts).encode("utf-8")
+    return int(hashlib.sha256(key).hexdigest()[:16], 16)
+
+
+def start_game(shooters, placements, seed, board_size=(10, 10), custom_ships=()):
+    """
+    Set up one silent game: place both fleets and start both shooters
+    :param shooters: (player1 Shooter, player2 Shooter) pair
+    :param placements: (player1 Placement, player2 Placement) pair
+    :param seed: integer seed of the game. Placements and shooters each draw from their own stream derived from it.
+    :param board_size: (board_x, board_y) tuple
+    :param custom_ships: (name, dimensions) pairs added to the default fleet with Game.add_custom_ship()
+    :return: the Game, ready for its first turn
+    """
+    game = Game("player1", "player2", board_size)
+    for ship_name, dimensions in custom_ships:
+        game.add_custom_ship(ship_name, dimensions)
+
+    game.initialize_ships(placements[0].place(game.ships, board_size, random.Random(derive_seed(seed, "place", 0))),
+                          placements[1].place(game.ships, board_size, random.Random(derive_seed(seed, "place", 1))))
+    shooters[0].start(game, game.player1, random.Random(derive_seed(seed, "shoot", 0)))
+    shooters[1].start(game, game.player2, random.Random(derive_seed(seed, "shoot", 1)))
+    return game
+
+
+def play_game(shooters, placements, seed, board_size=(10, 10), custom_ships=()):
+    """
+    Play one silent game to the end, see start_game() for the parameters
+    :return: (winner, turns) where winner is 0 if player1 won and 1 if player2 won, and turns is the number of shots
+        fired by both players
+    """
+    game = start_game(shooters, placements, seed, board_size, custom_ships)
+    while True:
+        shooter = shooters[game.turn % 2]
+        result = game.take_turn(shooter.choose_shot())
+        shooter.observe(result)
+        if result.winner is not None:
+            return (0 if result.winner is game.player1 else 1), game.turn
+
+
+class Entrant(object):
+    """
+    A named competitor of a tournament: a targeting strategy and a placement strategy
+    """
+    def __init__(self, name, shooter, placement):
+        self.name = name
+        self.shooter = shooter  # strategies.Shooter
+        self.placement = placement  # strategies.Placement
+
+    def __repr__(self):
+        return self.name
+
+
+class MatchResult(object):
+    """
+    Aggregated outcome of all the games played between two entrants. Every field is a sum or a Counter, so partial
+        results from different chunks can be merged in any order.
+    """
+    def __init__(self, name_a, name_b):
+        self.name_a = name_a
+        self.name_b = name_b
+        self.games = 0
+        self.wins_a = 0
+        self.wins_b = 0
+        self.shots_a = Counter()  # shots fired by entrant a in the games it won -> number of such games
+        self.shots_b = Counter()  # shots fired by entrant b in the games it won -> number of such games
+
+    def merge(self, other):
+        self.games += other.games
+        self.wins_a += other.wins_a
+        self.wins_b += other.wins_b
+        self.shots_a.update(other.shots_a)
+        self.shots_b.update(other.shots_b)
+
+    def winner(self):
+        """
+        :return: name of the entrant that won more games, None on a tie
+        """
+        if self.wins_a > self.wins_b:
+            return self.name_a
+        if self.wins_b > self.wins_a:
+            return self.name_b
+        return None
+
+    def __repr__(self):
+        return "MatchResult(%s %d - %d %s)" % (self.name_a, self.wins_a, self.wins_b, self.name_b)
+
+
+class EntrantStats(object):
+    """
+    Running totals of one entrant across a tournament
+    """
+    def __init__(self, name):
+        self.name = name
+        self.games = 0
+        self.wins = 0
+        self.points = 0.0  # 1 per match won, 0.5 per tied match
+        self.shots_to_win = Counter()  # shots needed to win -> number of games won with that many shots
+        self.opponents = set()
+
+    def win_rate(self):
+        if self.games == 0:
+            return 0.0
+        return float(self.wins) / self.games
+
+    def mean_shots_to_win(self):
+        if self.wins == 0:
+            return None
+        return float(sum(k * v for k, v in self.shots_to_win.items())) / self.wins
+
+    def __repr__(self):
+        return "%s: %d/%d wins (%.1f%%), %.1f points" % (self.name, self.wins, self.games, 100 * self.win_rate(),
+                                                         self.points)
+
+
+def _play_chunk(task):
+    """
+    Worker entry point: play the games first..last-1 of one match
+    :return: (match_id, MatchResult) with the results of those games
+    """
+    match_id, a, b, first, last, match_seed, board_size, custom_ships = task
+    result = MatchResult(a.name, b.name)
+    for k in range(first, last):
+        # entrants alternate between moving first and second
+        if k % 2 == 0:
+            winner, turns = play_game((a.shooter, b.shooter), (a.placement, b.placement), derive_seed(match_seed, k),
+                                      board_size, custom_ships)
+            a_won = winner == 0
+            a_shots = (turns + 1) // 2
+            b_shots = turns // 2
+        else:
+            winner, turns = play_game((b.shooter, a.shooter), (b.placement, a.placement), derive_seed(match_seed, k),
+                                      board_size, custom_ships)
+            a_won = winner == 1
+            a_shots = turns // 2
+            b_shots = (turns + 1) // 2
+        result.games += 1
+        if a_won:
+            result.wins_a += 1
+            result.shots_a[a_shots] += 1
+        else:
+            result.wins_b += 1
+            result.shots_b[b_shots] += 1
+    return match_id, result
+
+
+class Tournament(object):
+    def __init__(self, entrants, games_per_match=100, board_size=(10, 10), custom_ships=(), seed=0, workers=None,
+                 chunk_size=50):
+        """
+        Initializer for Tournament class
+        :param entrants: list of Entrant objects with unique names
+        :param games_per_match: number of games played by every pair of entrants that meet
+        :param board_size: board size of every game (2-tuple)
+        :param custom_ships: (name, dimensions) pairs added to the default fleet of every game
+        :param seed: tournament seed. Every game's seed is derived from it, the round and the entrants' names, so
+            results do not depend on the number of workers.
+        :param workers: number of worker processes, defaults to the number of cores. 0 plays every game in this process.
+        :param chunk_size: number of games handed to a worker at once
+        """
+        names = [e.name for e in entrants]
+        if len(set(names)) != len(names):
+            raise ValueError("Entrant names must be unique: %s" % names)
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1. You entered: %d" % chunk_size)
+        self.entrants = list(entrants)
+        self.games_per_match = games_per_match
+        self.board_size = tuple(board_size)
+        self.custom_ships = tuple(custom_ships)
+        self.seed = seed
+        self.workers = os.cpu_count() if workers is None else workers
+        self.chunk_size = chunk_size
+        self.stats = dict((e.name, EntrantStats(e.name)) for e in self.entrants)
+        self.matches = list()  # MatchResult of every match played so far, in scheduling order
+
+    def _tasks(self, pairings, round_number):
+        for match_id, (a, b) in enumerate(pairings):
+            match_seed = derive_seed(self.seed, round_number, a.name, b.name)
+            for first in range(0, self.games_per_match, self.chunk_size):
+                last = min(first + self.chunk_size, self.games_per_match)
+                yield (match_id, a, b, first, last, match_seed, self.board_size, self.custom_ships)
+
+    def play_round(self, pairings, round_number=0):
+        """
+        Play every match of a round, spreading the games over the worker processes and merging the results as the
+            chunks complete
+        :param pairings: list of (Entrant, Entrant) pairs
+        :param round_number: round number, part of every game's seed
+        :return: list of MatchResult, one per pairing
+        """
+        results = [MatchResult(a.name, b.name) for a, b in pairings]
+        tasks = self._tasks(pairings, round_number)
+
+        if self.workers == 0:
+            for task in tasks:
+                match_id, partial = _play_chunk(task)
+                results[match_id].merge(partial)
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(_play_chunk, task) for task in tasks]
+                for future in as_completed(futures):
+                    match_id, partial = future.result()
+                    results[match_id].merge(partial)
+
+        for result in results:
+            self._record(result)
+        return results
+
+    def _record(self, result):
+        self.matches.append(result)
+        a = self.stats[result.name_a]
+        b = self.stats[result.name_b]
+        a.games += result.games
+        b.games += result.games
+        a.wins += result.wins_a
+        b.wins += result.wins_b
+        a.shots_to_win.update(result.shots_a)
+        b.shots_to_win.update(result.shots_b)
+        a.opponents.add(b.name)
+        b.opponents.add(a.name)
+        winner = result.winner()
+        if winner is None:
+            a.points += 0.5
+            b.points += 0.5
+        else:
+            self.stats[winner].points += 1
+
+    def round_robin(self):
+        """
+        Every entrant plays every other entrant once
+        :return: standings, see .standings()
+        """
+        pairings = [(a, b) for i, a in enumerate(self.entrants) for b in self.entrants[i + 1:]]
+        self.play_round(pairings)
+        return self.standings()
+
+    def swiss(self, rounds):
+        """
+        Swiss system: every round pairs entrants with similar points that have not met yet. With an odd number of
+            entrants the lowest ranked entrant without a bye sits the round out and gets a point.
+        :param rounds: number of rounds to play
+        :return: standings, see .standings()
+        """
+        byes = set()
+        for round_number in range(rounds):
+            ranked = sorted(self.entrants, key=lambda e: (-self.stats[e.name].points, e.name))
+            if len(ranked) % 2 == 1:
+                candidates = [e for e in reversed(ranked) if e.name not in byes] or list(reversed(ranked))
+                bye = candidates[0]
+                byes.add(bye.name)
+                self.stats[bye.name].points += 1
+                ranked.remove(bye)
+
+            pairings = list()
+            while ranked:
+                a = ranked.pop(0)
+                # the best ranked entrant a has not met yet, or the best ranked one if it has met them all
+                opponent = next((b for b in ranked if b.name not in self.stats[a.name].opponents), ranked[0])
+                ranked.remove(opponent)
+                pairings.append((a, opponent))
+            self.play_round(pairings, round_number)
+        return self.standings()
+
+    def standings(self):
+        """
+        :return: list of EntrantStats sorted by points, then win rate
+        """
+        return sorted(self.stats.values(), key=lambda s: (-s.points, -s.win_rate(), s.name))